@@ -1,19 +1,113 @@
+import csv
+import tempfile
 from django.contrib import admin
-from .models import Ticket, UserMessage
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.functional import cached_property
+from .availability import tickets_changed
+from .events import forget_event
+from .message_feed import forget_first_page
+from .models import Event, Ticket, TicketTransition, UserMessage
+from .services import delete_tickets, save_ticket, transition_tickets
 
 from django.utils.html import format_html
 
+EXPORT_COLUMNS = ['Sự kiện', 'Số Vé', 'Trạng Thái', 'Tên Người Mua', 'SĐT', 'Thời gian Khóa', 'Cập nhật lần cuối']
+EXPORT_FIELDS = ('event__slug', 'number', 'status', 'buyer_name', 'buyer_phone', 'locked_at', 'updated_at')
+EXPORT_CHUNK_SIZE = 2000
+# Below this many rows an exact COUNT is cheap enough
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class _Echo:
+    """File-like object for csv.writer that returns each line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that estimates the size of an unfiltered table instead of
+    running COUNT(*) over it: the planner's row estimate on PostgreSQL, the
+    highest id elsewhere. Filtered and small lists are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = self._estimate(queryset)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+    def _estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        return queryset.aggregate(max_id=Max('pk'))['max_id']
+
+
+@admin.register(Event)
+class EventAdmin(admin.ModelAdmin):
+    list_display = (
+        'name', 'slug', 'first_number', 'last_number', 'price', 'lock_seconds',
+        'available_count', 'locked_count', 'sold_count', 'revenue', 'created_at',
+    )
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
+
+    def get_queryset(self, request):
+        # Totals come from the status counters, fetched for the whole page at once
+        return super().get_queryset(request).prefetch_related('status_counters')
+
+    def _count(self, obj, status):
+        return next((counter.count for counter in obj.status_counters.all() if counter.status == status), 0)
+
+    def available_count(self, obj):
+        return self._count(obj, 'AVAILABLE')
+    available_count.short_description = 'Còn trống'
+
+    def locked_count(self, obj):
+        return self._count(obj, 'LOCKED')
+    locked_count.short_description = 'Đang giữ'
+
+    def sold_count(self, obj):
+        return self._count(obj, 'SOLD')
+    sold_count.short_description = 'Đã bán'
+
+    def revenue(self, obj):
+        return f"{self._count(obj, 'SOLD') * obj.price:,} đ"
+    revenue.short_description = 'Doanh thu'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        forget_event(obj.slug)
+        # The price and lock window feed the grid and snapshot
+        tickets_changed(obj.id, None)
+
+
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ('number', 'status_badge', 'buyer_name', 'buyer_phone', 'locked_at', 'updated_at')
-    list_filter = ('status',)
+    list_display = ('number', 'event', 'status_badge', 'buyer_name', 'buyer_phone', 'locked_at', 'updated_at')
+    list_filter = ('event', 'status')
+    list_select_related = ('event',)
     search_fields = ('number', 'buyer_name', 'buyer_phone')
-    ordering = ('number',)
-    actions = ['mark_as_sold', 'mark_as_available', 'export_to_excel']
+    ordering = ('event', 'number')
+    actions = ['mark_as_sold', 'mark_as_available', 'export_to_excel', 'export_to_csv']
     
     fieldsets = (
         ('Thông tin vé', {
-            'fields': ('number', 'status')
+            'fields': ('event', 'number', 'status')
         }),
         ('Thông tin người mua', {
             'fields': ('buyer_name', 'buyer_phone')
@@ -39,48 +133,119 @@ class TicketAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Trạng thái'
     status_badge.admin_order_field = 'status'
 
+    def save_model(self, request, obj, form, change):
+        save_ticket(obj, 'admin')
+
+    def delete_model(self, request, obj):
+        delete_tickets(Ticket.objects.filter(pk=obj.pk), 'admin')
+
+    def delete_queryset(self, request, queryset):
+        delete_tickets(queryset, 'admin')
+
     def mark_as_sold(self, request, queryset):
-        queryset.update(status='SOLD')
-        self.message_user(request, f"Đã đánh dấu {queryset.count()} vé là ĐÃ BÁN.")
+        sold = transition_tickets(queryset, 'SOLD', 'admin')
+        self.message_user(request, f"Đã đánh dấu {sold} vé là ĐÃ BÁN.")
     mark_as_sold.short_description = "Đánh dấu là ĐÃ BÁN"
 
     def mark_as_available(self, request, queryset):
-        queryset.update(status='AVAILABLE', buyer_name=None, buyer_phone=None, locked_at=None)
-        self.message_user(request, f"Đã hủy và mở lại {queryset.count()} vé.")
+        released = transition_tickets(
+            queryset, 'AVAILABLE', 'admin', buyer_name=None, buyer_phone=None, locked_at=None, reservation=None
+        )
+        self.message_user(request, f"Đã hủy và mở lại {released} vé.")
     mark_as_available.short_description = "Hủy vé / Xóa thông tin người mua"
 
+    def _export_rows(self, queryset):
+        # Plain tuples fetched in chunks, so memory does not grow with the table
+        status_labels = dict(Ticket.STATUS_CHOICES)
+        rows = queryset.order_by('event', 'number').values_list(*EXPORT_FIELDS).iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        )
+        for event_slug, number, status, buyer_name, buyer_phone, locked_at, updated_at in rows:
+            yield [
+                event_slug,
+                number,
+                status_labels.get(status, status),
+                buyer_name,
+                buyer_phone,
+                locked_at.replace(tzinfo=None) if locked_at else '',
+                updated_at.replace(tzinfo=None) if updated_at else '',
+            ]
+
     def export_to_excel(self, request, queryset):
         import openpyxl
-        from django.http import HttpResponse
         
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename="tickets.xlsx"'
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Tickets"
+        # Write-only mode streams rows to a temp file instead of keeping cells in memory
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Tickets")
+        ws.append(EXPORT_COLUMNS)
+        for row in self._export_rows(queryset):
+            ws.append(row)
         
-        columns = ['Số Vé', 'Trạng Thái', 'Tên Người Mua', 'SĐT', 'Thời gian Khóa', 'Cập nhật lần cuối']
-        ws.append(columns)
+        output = tempfile.TemporaryFile()
+        wb.save(output)
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename='tickets.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    export_to_excel.short_description = "Xuất ra Excel"
+
+    def export_to_csv(self, request, queryset):
+        writer = csv.writer(_Echo())
         
-        for ticket in queryset:
-            start_time = ticket.locked_at.replace(tzinfo=None) if ticket.locked_at else ''
-            updated_time = ticket.updated_at.replace(tzinfo=None) if ticket.updated_at else ''
-            row = [
-                ticket.number,
-                ticket.get_status_display(),
-                ticket.buyer_name,
-                ticket.buyer_phone,
-                start_time,
-                updated_time,
-            ]
-            ws.append(row)
-            
-        wb.save(response)
+        def stream():
+            # BOM so Excel opens the Vietnamese text as UTF-8
+            yield '\ufeff' + writer.writerow(EXPORT_COLUMNS)
+            for row in self._export_rows(queryset):
+                yield writer.writerow(row)
+        
+        response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="tickets.csv"'
         return response
-    export_to_excel.short_description = "Xuất ra Excel"
+    export_to_csv.short_description = "Xuất ra CSV"
+
+
+@admin.register(TicketTransition)
+class TicketTransitionAdmin(admin.ModelAdmin):
+    """Read-only view of the ticket status log."""
+    list_display = ('created_at', 'event', 'number', 'from_status', 'to_status', 'source')
+    list_filter = ('event', 'to_status', 'source')
+    list_select_related = ('event',)
+    search_fields = ('=number',)
+    ordering = ('-id',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(UserMessage)
 class UserMessageAdmin(admin.ModelAdmin):
-    list_display = ('name', 'phone', 'message', 'created_at')
+    list_display = ('name', 'phone', 'message', 'is_public', 'created_at')
+    list_filter = ('is_public',)
     search_fields = ('name', 'phone', 'message')
-    ordering = ('-created_at',)
+    ordering = ('-created_at', '-id')
+    # Skip the COUNT(*) over the whole table on every changelist page
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        forget_first_page()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        forget_first_page()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        forget_first_page()
@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class FundraisingConfig(AppConfig):
+    # Matches the id fields in the existing migrations
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'fundraising'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        # Alternative to running the reap_expired_locks command as its own process.
+        # Started by the first request, so migrate, shell and the runserver
+        # autoreloader never run one, and gunicorn --preload starts it after the fork.
+        if settings.TICKET_REAPER_THREAD:
+            from .reaper import start_reaper_thread
+            request_started.connect(start_reaper_thread, dispatch_uid='fundraising.reaper')
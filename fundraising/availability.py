@@ -0,0 +1,244 @@
+import time
+from collections import namedtuple
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from .broadcast import ticket_broadcaster
+from .models import Event, Ticket, lock_expiry_threshold
+
+# Everything is kept per event: the keys take the event id first
+SNAPSHOT_KEY = 'ticket_availability:{}:snapshot:{}'
+SNAPSHOT_TIMEOUT = 60 * 60
+# Changes made by each version, so clients can catch up without a full reload
+DELTA_KEY = 'ticket_availability:{}:delta:{}'
+# Version of the newest snapshot built, which later versions are patched from
+LATEST_KEY = 'ticket_availability:{}:latest'
+SNAPSHOT_CHUNK_SIZE = 10000
+DELTA_TIMEOUT = 60 * 10
+MAX_DELTA_VERSIONS = 500
+
+# One byte per ticket number; 0 means there is no ticket with that number.
+# Codes sort in the same order as the status names.
+STATUS_CODES = {'AVAILABLE': 1, 'LOCKED': 2, 'SOLD': 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+# Compact form used on the wire
+STATUS_LETTERS = {'AVAILABLE': 'A', 'LOCKED': 'L', 'SOLD': 'S'}
+LETTER_CODES = {STATUS_LETTERS[name]: code for name, code in STATUS_CODES.items()}
+# Status bytes -> letters, with '-' for numbers that have no ticket
+STATUS_STRING_TABLE = bytes.maketrans(
+    bytes([0, *STATUS_NAMES]),
+    ('-' + ''.join(STATUS_LETTERS[name] for name in STATUS_NAMES.values())).encode(),
+)
+
+TicketStatus = namedtuple('TicketStatus', ['number', 'status'])
+
+
+def get_version(event_id):
+    return Event.objects.filter(pk=event_id).values_list('availability_version', flat=True).get()
+
+
+def bump_version(event_id):
+    """
+    Move the event to a new version. The version lives on the event row, so
+    every worker gets a distinct number, and a bump made in the caller's
+    transaction is rolled back with it.
+    """
+    with transaction.atomic():
+        Event.objects.filter(pk=event_id).update(availability_version=F('availability_version') + 1)
+        return get_version(event_id)
+
+
+def tickets_changed(event_id, changes):
+    """
+    Record that ticket state in an event changed. Call this from every status
+    transition with a {number: new status} mapping (None for a deleted
+    ticket), or with None when too many tickets changed to list. The version
+    is bumped in the caller's transaction; the delta and the push to connected
+    clients wait for the commit.
+    """
+    changes = dict(changes) if changes is not None else None
+    version = bump_version(event_id)
+
+    def publish():
+        if changes is None:
+            # No delta is logged, so clients fall back to the full statuses
+            ticket_broadcaster.publish({'event': event_id, 'version': version, 'resync': True})
+            return
+        letters = {number: STATUS_LETTERS.get(status) for number, status in changes.items()}
+        cache.set(DELTA_KEY.format(event_id, version), (time.time(), letters), DELTA_TIMEOUT)
+        ticket_broadcaster.publish({'event': event_id, 'version': version, 'changes': letters})
+
+    transaction.on_commit(publish)
+
+
+def _deltas_since(event_id, since, version):
+    # (published_at, {number: letter}) for each version, oldest first
+    if since > version or version - since > MAX_DELTA_VERSIONS:
+        return None
+    keys = [DELTA_KEY.format(event_id, v) for v in range(since + 1, version + 1)]
+    deltas = cache.get_many(keys)
+    if len(deltas) != len(keys):
+        return None
+    return [deltas[key] for key in keys]
+
+
+def changes_since(event_id, since, version):
+    """
+    Merge the changes of every version after `since` up to `version`. Returns
+    None when the log cannot bridge the gap (too far back, evicted, or a
+    version that was bumped for an expired lock), so the caller sends
+    everything instead.
+    """
+    deltas = _deltas_since(event_id, since, version)
+    if deltas is None:
+        return None
+    changes = {}
+    for _, letters in deltas:
+        changes.update(letters)
+    return changes
+
+
+class AvailabilitySnapshot:
+    """
+    Status of every ticket in an event as a byte string, where byte i is
+    ticket number first + i.
+    """
+
+    # Snapshots pickled before `first` existed are indexed by the number itself
+    first = 0
+
+    def __init__(self, version, statuses, expires_at=None, first=1):
+        self.version = version
+        self.statuses = statuses
+        # When the oldest live lock runs out the snapshot no longer matches the DB
+        self.expires_at = expires_at
+        self.first = first
+
+    @staticmethod
+    def _place(statuses, first, number):
+        # (index of number, new first), growing `statuses` for tickets outside the range
+        if number < first:
+            statuses[0:0] = bytes(first - number)
+            first = number
+        elif number - first >= len(statuses):
+            statuses.extend(bytes(number - first + 1 - len(statuses)))
+        return number - first, first
+
+    @classmethod
+    def build(cls, event, version):
+        rows = (
+            Ticket.objects.filter(event=event)
+            .values_list('number', 'status', 'locked_at')
+            .iterator(chunk_size=SNAPSHOT_CHUNK_SIZE)
+        )
+        first = event.first_number
+        statuses = bytearray(max(event.last_number - first + 1, 0))
+        threshold = lock_expiry_threshold(event.lock_seconds)
+        oldest_lock = None
+
+        for number, status, locked_at in rows:
+            index, first = cls._place(statuses, first, number)
+            if status == 'LOCKED' and locked_at is not None:
+                if locked_at < threshold:
+                    status = 'AVAILABLE'
+                elif oldest_lock is None or locked_at < oldest_lock:
+                    oldest_lock = locked_at
+            statuses[index] = STATUS_CODES.get(status, STATUS_CODES['SOLD'])
+
+        expires_at = None
+        if oldest_lock is not None:
+            expires_at = oldest_lock.timestamp() + event.lock_seconds
+        return cls(version, bytes(statuses), expires_at, first)
+
+    def patched(self, version, deltas, lock_seconds):
+        """A copy brought up to `version` by applying logged deltas."""
+        statuses = bytearray(self.statuses)
+        expires_at = self.expires_at
+        first = self.first
+        for published_at, letters in deltas:
+            for number, letter in letters.items():
+                index, first = self._place(statuses, first, int(number))
+                statuses[index] = LETTER_CODES.get(letter, 0)
+                if letter == 'L' and expires_at is None:
+                    # Deltas are oldest first, so the first new lock is the oldest
+                    expires_at = published_at + lock_seconds
+        return AvailabilitySnapshot(version, bytes(statuses), expires_at, first)
+
+    def is_fresh(self):
+        return self.expires_at is None or time.time() < self.expires_at
+
+    def status_string(self):
+        """Statuses as letters (A/L/S, '-' for no ticket); letter i is ticket first + i."""
+        return self.statuses.translate(STATUS_STRING_TABLE).decode('ascii')
+
+    def ticket_count(self):
+        return len(self.statuses) - self.statuses.count(0)
+
+    def status_of(self, number):
+        index = number - self.first
+        if 0 <= index < len(self.statuses):
+            return STATUS_NAMES.get(self.statuses[index])
+        return None
+
+    def tickets(self, start=0, stop=None):
+        """
+        Tickets as (number, status), ordered by status then number, from
+        position `start` up to `stop`. Whole statuses before `start` are
+        skipped by counting, so a page costs about its own size.
+        """
+        if stop is None:
+            stop = self.ticket_count()
+        result = []
+        position = 0
+        for code in sorted(STATUS_NAMES):
+            if position >= stop:
+                break
+            in_status = self.statuses.count(code)
+            if position + in_status <= start:
+                position += in_status
+                continue
+            needle = bytes([code])
+            index = self.statuses.find(needle)
+            while index != -1 and position < stop:
+                if position >= start:
+                    result.append(TicketStatus(self.first + index, STATUS_NAMES[code]))
+                position += 1
+                index = self.statuses.find(needle, index + 1)
+        return result
+
+
+def _patch_latest(event, version):
+    # The newest snapshot plus the deltas since; None when a full build is needed
+    latest = cache.get(LATEST_KEY.format(event.id))
+    if latest is None or latest >= version:
+        return None
+    base = cache.get(SNAPSHOT_KEY.format(event.id, latest))
+    if base is None or not base.is_fresh():
+        return None
+    deltas = _deltas_since(event.id, latest, version)
+    if deltas is None:
+        return None
+    return base.patched(version, deltas, event.lock_seconds)
+
+
+def get_snapshot(event):
+    """
+    Return the event's snapshot for its current version. A missing one is
+    patched from the previous snapshot when the delta log allows, and only
+    otherwise built from one query over the event's tickets.
+    """
+    version = get_version(event.id)
+    snapshot = cache.get(SNAPSHOT_KEY.format(event.id, version))
+    if snapshot is not None:
+        if snapshot.is_fresh():
+            return snapshot
+        # A lock ran out without any write; move everyone to a new version
+        version = bump_version(event.id)
+    else:
+        snapshot = _patch_latest(event, version)
+
+    if snapshot is None or snapshot.version != version:
+        snapshot = AvailabilitySnapshot.build(event, version)
+    cache.set(SNAPSHOT_KEY.format(event.id, version), snapshot, SNAPSHOT_TIMEOUT)
+    cache.set(LATEST_KEY.format(event.id), version, SNAPSHOT_TIMEOUT)
+    return snapshot
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+
+class Broadcaster:
+    """
+    In-process fan-out of ticket status events to connected clients.
+
+    Each subscriber is an asyncio queue living on the event loop that created
+    it; publish() can be called from any thread, including sync views.
+    """
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {s for s in self._subscribers if s[1] is not queue}
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's loop is gone
+                self.unsubscribe(queue)
+
+    def _deliver(self, queue, event):
+        if queue.full():
+            # A client this far behind resyncs from scratch instead of replaying
+            while not queue.empty():
+                queue.get_nowait()
+            event = {'resync': True}
+        queue.put_nowait(event)
+
+
+ticket_broadcaster = Broadcaster()
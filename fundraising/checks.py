@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Availability snapshots and deltas, grid fragments and checkout replays
+    are kept in the default cache; a per-process cache serves stale tickets
+    as soon as there is more than one worker.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f'{backend} keeps a separate cache in every worker process.',
+            hint='Set CACHE_BACKEND to a shared backend such as Redis or the file-based cache.',
+            id='fundraising.E001',
+        )
+    ]
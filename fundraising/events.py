@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from .models import Event
+
+EVENT_KEY = 'event:{}'
+# Short enough that edits made outside the admin still show up soon
+EVENT_TIMEOUT = 60
+
+
+def get_event(slug=None):
+    """
+    Return the event with this slug (the default event when None), cached
+    briefly since every page needs it. Raises Http404 for an unknown slug.
+    """
+    slug = slug or settings.DEFAULT_EVENT_SLUG
+    key = EVENT_KEY.format(slug)
+    event = cache.get(key)
+    if event is None:
+        event = Event.objects.filter(slug=slug).first()
+        if event is None:
+            raise Http404('No such event')
+        cache.set(key, event, EVENT_TIMEOUT)
+    return event
+
+
+def forget_event(slug):
+    cache.delete(EVENT_KEY.format(slug))
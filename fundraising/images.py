@@ -0,0 +1,343 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+from .metrics import timed
+
+TEMPLATE_PATH = os.path.join(
+    settings.BASE_DIR,
+    'fundraising',
+    'static',
+    'fundraising',
+    'images',
+    'veso.jpg'
+)
+
+FONT_PATH = os.path.join(
+    settings.BASE_DIR,
+    'fundraising',
+    'static',
+    'fundraising',
+    'fonts',
+    'Roboto-Regular.ttf'
+)
+
+# Quality of the full-size JPEG, the one buyers download and print
+JPEG_QUALITY = 95
+FONT_SIZE = 48
+# Seconds between checks that the template and font on disk are unchanged
+ASSET_CHECK_INTERVAL = 1.0
+
+# Named sizes as a target width in pixels; None keeps the template's size
+IMAGE_VARIANTS = {'thumbnail': 480, 'preview': 960, 'full': None}
+
+ImageFormat = namedtuple('ImageFormat', ['pil_format', 'content_type', 'extension', 'web_quality', 'save_options'])
+
+IMAGE_FORMATS = {
+    'jpeg': ImageFormat('JPEG', 'image/jpeg', 'jpg', 80, {'progressive': True, 'optimize': True}),
+    'webp': ImageFormat('WEBP', 'image/webp', 'webp', 80, {'method': 4}),
+    'avif': ImageFormat('AVIF', 'image/avif', 'avif', 60, {'speed': 6}),
+}
+
+# Preferred first; JPEG is always available as the fallback
+NEGOTIATED_FORMATS = ('avif', 'webp')
+
+
+class TicketAssets:
+    """
+    Decoded ticket template and parsed font, shared by every render in the process.
+    """
+
+    def __init__(self):
+        self.signature = _asset_signature()
+        with open(TEMPLATE_PATH, 'rb') as f:
+            template_bytes = f.read()
+        with open(FONT_PATH, 'rb') as f:
+            font_bytes = f.read()
+
+        self.template_hash = hashlib.sha256(template_bytes).hexdigest()
+        self.font_hash = hashlib.sha256(font_bytes).hexdigest()
+        self.base = Image.open(io.BytesIO(template_bytes)).convert("RGB")
+        self.font = ImageFont.truetype(io.BytesIO(font_bytes), FONT_SIZE)
+
+    @property
+    def modified(self):
+        """When the template or font last changed, as a Unix timestamp."""
+        return max(mtime_ns for mtime_ns, _ in self.signature) // 1_000_000_000
+
+
+def _asset_signature():
+    signature = []
+    for path in (TEMPLATE_PATH, FONT_PATH):
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+_assets = None
+_assets_checked = 0.0
+_assets_lock = threading.Lock()
+
+
+def ticket_assets_current():
+    """
+    True when the assets are loaded and were checked against the disk within
+    ASSET_CHECK_INTERVAL, i.e. get_ticket_assets() will not touch the disk.
+    """
+    return _assets is not None and time.monotonic() - _assets_checked < ASSET_CHECK_INTERVAL
+
+
+def get_ticket_assets():
+    """
+    Return the process-wide assets, reloading them if the template or font
+    changed on disk since they were loaded. The files are stat'ed at most
+    once per ASSET_CHECK_INTERVAL.
+    """
+    global _assets, _assets_checked
+    assets = _assets
+    if ticket_assets_current():
+        return assets
+    if assets is not None and assets.signature == _asset_signature():
+        _assets_checked = time.monotonic()
+        return assets
+
+    with _assets_lock:
+        if _assets is None or _assets.signature != _asset_signature():
+            _assets = TicketAssets()
+        _assets_checked = time.monotonic()
+        return _assets
+
+
+def preload_assets():
+    """
+    Load the assets up front, e.g. in the gunicorn master with --preload so
+    forked workers share the decoded template instead of each decoding it.
+    """
+    get_ticket_assets()
+
+
+@timed('ticket_render')
+def generate_ticket_image(ticket_number):
+    """
+    Generate a ticket image with the ticket number overlaid on the bottom-right corner.
+    Returns a PIL Image object.
+    """
+    assets = get_ticket_assets()
+
+    # Copy the decoded base so only the number has to be drawn
+    img = assets.base.copy()
+    draw = ImageDraw.Draw(img)
+
+    # ✅ Format ticket number (001, 002, ..., 100)
+    formatted_number = f"{int(ticket_number):03d}"
+    text = f"{formatted_number}"
+
+    font = assets.font
+
+    # Calculate text size
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+
+    # Position: bottom-right corner
+    padding = 15
+    img_width, img_height = img.size
+    x = img_width - text_width - padding - 118
+    y = img_height - text_height - padding - 45
+
+    # ✅ Draw text (black, no background)
+    draw.text(
+        (x, y),
+        text,
+        font=font,
+        fill=(0, 0, 0)  # black text
+    )
+
+    return img
+
+
+def _can_save(pil_format):
+    Image.init()
+    return pil_format in Image.SAVE
+
+
+SUPPORTED_FORMATS = {name for name, fmt in IMAGE_FORMATS.items() if _can_save(fmt.pil_format)}
+
+
+def negotiate_format(accept):
+    """
+    Pick the smallest format the Accept header names explicitly. Wildcards
+    do not count: plenty of clients send */* and still only handle JPEG.
+    """
+    accepted = set()
+    for item in accept.split(','):
+        media_type, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media_type.strip().lower())
+
+    for name in NEGOTIATED_FORMATS:
+        if name in SUPPORTED_FORMATS and IMAGE_FORMATS[name].content_type in accepted:
+            return name
+    return 'jpeg'
+
+
+def image_quality(variant, image_format):
+    # The full JPEG is the print copy; every other encoding is only looked at on screens
+    if variant == 'full' and image_format == 'jpeg':
+        return JPEG_QUALITY
+    return IMAGE_FORMATS[image_format].web_quality
+
+
+def render_variant(ticket_number, variant='full'):
+    img = generate_ticket_image(ticket_number)
+    width = IMAGE_VARIANTS[variant]
+    if width and width < img.width:
+        img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+    return img
+
+
+def encode_image(img, image_format='jpeg', quality=JPEG_QUALITY):
+    fmt = IMAGE_FORMATS[image_format]
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt.pil_format, quality=quality, **fmt.save_options)
+    return buffer.getvalue()
+
+
+def ticket_image_key(ticket_number, variant='full', image_format='jpeg'):
+    """
+    Content address of a rendered ticket: it changes whenever the number,
+    the template, the font, the size or the encoder settings change.
+    """
+    assets = get_ticket_assets()
+    parts = [
+        str(int(ticket_number)),
+        assets.template_hash,
+        assets.font_hash,
+        variant,
+        image_format,
+        str(image_quality(variant, image_format)),
+    ]
+    digest = hashlib.sha256(':'.join(parts).encode()).hexdigest()
+    return f'{digest}.{IMAGE_FORMATS[image_format].extension}'
+
+
+def ticket_image_etag(ticket_number, variant='full', image_format='jpeg'):
+    """Strong ETag for a ticket image: its content key, quoted."""
+    return f'"{ticket_image_key(ticket_number, variant, image_format)}"'
+
+
+def ticket_image_validators(ticket_number, variant='full', image_format='jpeg'):
+    """(ETag, Last-Modified timestamp) for a ticket image."""
+    return ticket_image_etag(ticket_number, variant, image_format), get_ticket_assets().modified
+
+
+class TicketImageCache:
+    """
+    Two-tier cache of encoded ticket images: a bounded in-process LRU in
+    front of a directory of files named by content key.
+    """
+
+    def __init__(self, max_entries, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def set(self, key, data):
+        self._remember(key, data)
+        if self.directory:
+            self._write_file(key, data)
+
+    def has_file(self, key):
+        return bool(self.directory) and os.path.exists(self._path(key))
+
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, data):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _write_file(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so concurrent readers never see a partial image
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+image_cache = TicketImageCache(
+    max_entries=settings.TICKET_IMAGE_CACHE_SIZE,
+    directory=settings.TICKET_IMAGE_CACHE_DIR,
+)
+
+
+def get_ticket_image_bytes(ticket_number, variant='full', image_format='jpeg'):
+    """
+    Return the encoded image for a ticket, rendering it only on a cache miss.
+    The defaults give the full-size print JPEG.
+    """
+    key = ticket_image_key(ticket_number, variant, image_format)
+    data = image_cache.get(key)
+    if data is None:
+        data = encode_image(
+            render_variant(ticket_number, variant), image_format, image_quality(variant, image_format)
+        )
+        image_cache.set(key, data)
+    return data
+
+
+# Bounded pool for Pillow work, so rendering never runs on the event loop and
+# a burst of downloads cannot take every thread in the process
+render_pool = ThreadPoolExecutor(
+    max_workers=settings.TICKET_RENDER_WORKERS,
+    thread_name_prefix='ticket-render',
+)
+
+
+async def run_in_render_pool(func, *args):
+    """Await func(*args) on the render pool."""
+    return await asyncio.get_running_loop().run_in_executor(render_pool, func, *args)
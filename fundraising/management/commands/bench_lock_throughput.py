@@ -0,0 +1,125 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.utils import timezone
+from fundraising.models import Event, Ticket
+from mysite.database import sqlite_options
+
+# (label, sqlite_options kwargs); the last one is what settings.py uses by default
+MODES = [
+    ('rollback journal, deferred', {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'transaction_mode': None}),
+    ('WAL, deferred', {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'transaction_mode': None}),
+    ('WAL, immediate', {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'transaction_mode': 'IMMEDIATE'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare ticket lock throughput on SQLite across journal and transaction modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Threads locking and releasing tickets')
+        parser.add_argument('--readers', type=int, default=4, help='Threads counting available tickets')
+        parser.add_argument('--tickets', type=int, default=1000)
+        parser.add_argument('--tickets-per-lock', type=int, default=3)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per mode')
+        parser.add_argument('--busy-timeout', type=float, default=5.0,
+                            help='Seconds a connection waits for the write lock')
+
+    def handle(self, *args, **options):
+        db_dir = tempfile.mkdtemp(prefix='bench_lock_')
+        try:
+            self.stdout.write(
+                f'{"mode":<28}{"locks/s":>10}{"reads/s":>10}{"conflicts":>11}{"locked errors":>15}'
+            )
+            for i, (label, mode) in enumerate(MODES):
+                alias = f'bench_{i}'
+                connections.settings[alias] = connections.configure_settings({
+                    DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+                    alias: {
+                        'ENGINE': 'django.db.backends.sqlite3',
+                        'NAME': os.path.join(db_dir, f'{alias}.sqlite3'),
+                        'OPTIONS': sqlite_options(busy_timeout=options['busy_timeout'], **mode),
+                    },
+                })[alias]
+                try:
+                    result = self.run_mode(alias, options)
+                finally:
+                    connections[alias].close()
+                self.stdout.write(
+                    f'{label:<28}'
+                    f'{result["locks"] / options["duration"]:>10.1f}'
+                    f'{result["reads"] / options["duration"]:>10.1f}'
+                    f'{result["conflicts"]:>11}'
+                    f'{result["locked"]:>15}'
+                )
+        finally:
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+    def run_mode(self, alias, options):
+        call_command('migrate', 'fundraising', database=alias, verbosity=0)
+        event, _ = Event.objects.using(alias).get_or_create(slug='bench', defaults={'name': 'Bench'})
+        Ticket.objects.using(alias).bulk_create(
+            Ticket(event=event, number=n) for n in range(1, options['tickets'] + 1)
+        )
+
+        result = Counter()
+        result_lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def record(key):
+            with result_lock:
+                result[key] += 1
+
+        def writer(seed):
+            # Same shape as the views: read inside the transaction, then one
+            # conditional UPDATE. Under DEFERRED the read takes a shared lock and
+            # upgrading it to a write lock fails at once when another writer is active.
+            rng = random.Random(seed)
+            tickets = Ticket.objects.using(alias)
+            try:
+                while time.perf_counter() < deadline:
+                    numbers = rng.sample(range(1, options['tickets'] + 1), options['tickets_per_lock'])
+                    try:
+                        with transaction.atomic(using=alias):
+                            list(tickets.filter(number__in=numbers).values_list('status', flat=True))
+                            updated = tickets.filter(number__in=numbers, status='AVAILABLE').update(
+                                status='LOCKED', locked_at=timezone.now()
+                            )
+                            if updated != len(numbers):
+                                transaction.set_rollback(True, using=alias)
+                        if updated != len(numbers):
+                            record('conflicts')
+                            continue
+                        tickets.filter(number__in=numbers).update(status='AVAILABLE', locked_at=None)
+                        record('locks')
+                    except OperationalError:
+                        record('locked')
+            finally:
+                connections[alias].close()
+
+        def reader():
+            tickets = Ticket.objects.using(alias)
+            try:
+                while time.perf_counter() < deadline:
+                    try:
+                        tickets.filter(status='AVAILABLE').count()
+                        record('reads')
+                    except OperationalError:
+                        record('locked')
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return result
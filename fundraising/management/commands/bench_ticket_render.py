@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFont
+from fundraising.images import (
+    FONT_PATH, FONT_SIZE, JPEG_QUALITY, TEMPLATE_PATH, encode_image, generate_ticket_image,
+)
+
+
+def _render_from_disk(ticket_number):
+    # The pre-registry path: decode the template and parse the font on every call
+    img = Image.open(TEMPLATE_PATH).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.truetype(FONT_PATH, FONT_SIZE)
+    text = f"{int(ticket_number):03d}"
+    bbox = draw.textbbox((0, 0), text, font=font)
+    x = img.width - (bbox[2] - bbox[0]) - 15 - 118
+    y = img.height - (bbox[3] - bbox[1]) - 15 - 45
+    draw.text((x, y), text, font=font, fill=(0, 0, 0))
+    return img
+
+
+class Command(BaseCommand):
+    help = 'Measure ticket renders per second with and without the preloaded assets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=200)
+        parser.add_argument('--encode', action='store_true',
+                            help='Include JPEG encoding in each render')
+
+    def handle(self, *args, **options):
+        renders = options['renders']
+        # Warm the registry so its one-time load is not counted
+        generate_ticket_image(1)
+
+        for label, render in (('from disk', _render_from_disk), ('preloaded', generate_ticket_image)):
+            started = time.perf_counter()
+            for i in range(renders):
+                img = render(i % 500 + 1)
+                if options['encode']:
+                    encode_image(img, 'jpeg', JPEG_QUALITY)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label:>10}: {renders / elapsed:8.1f} renders/s')
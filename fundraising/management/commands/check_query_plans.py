@@ -0,0 +1,98 @@
+import re
+import uuid
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from fundraising.models import Reservation, StatusCounter, Ticket, TicketTransition, UserMessage
+
+SAMPLE_EVENT = 1
+SAMPLE_NUMBERS = [1, 2, 3]
+SAMPLE_CURSOR = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+# Hot queries from views.py, reaper.py, availability.py, services.py, message_pool.py,
+# message_feed.py and admin.py.
+# Reading all of one event's tickets for the snapshot is fine; reading every event's is not.
+HOT_QUERIES = [
+    ('claim_tickets candidates',
+     lambda: Ticket.objects.filter(event_id=SAMPLE_EVENT).claimable().filter(number__in=SAMPLE_NUMBERS)),
+    ('reservation lookup',
+     lambda: Reservation.objects.filter(token=uuid.UUID(int=0), session_key='x')),
+    ('checkout sell / cancel_checkout',
+     lambda: Ticket.objects.filter(reservation_id=1, status='LOCKED')),
+    ('download_all_tickets',
+     lambda: Ticket.objects.filter(reservation_id=1, status='SOLD').order_by('number')),
+    ('serve_ticket_image',
+     lambda: Ticket.objects.filter(id=1)),
+    ('release_expired_tickets',
+     lambda: Ticket.objects.filter(event_id=SAMPLE_EVENT).expired_locks()),
+    ('availability snapshot',
+     lambda: Ticket.objects.filter(event_id=SAMPLE_EVENT).values_list('number', 'status', 'locked_at')),
+    ('transition row lock',
+     lambda: Ticket.objects.filter(reservation_id=1, status='LOCKED').order_by('id').values_list('id', 'status')),
+    ('status counter update',
+     lambda: StatusCounter.objects.filter(event_id=SAMPLE_EVENT, status='SOLD')),
+    ('event stats',
+     lambda: StatusCounter.objects.filter(event_id=SAMPLE_EVENT).values_list('status', 'count')),
+    ('ticket history',
+     lambda: TicketTransition.objects.filter(event_id=SAMPLE_EVENT, number=1).order_by('id')),
+    ('admin status filter',
+     lambda: Ticket.objects.filter(event_id=SAMPLE_EVENT, status='SOLD').order_by('number')),
+    ('random message pick',
+     lambda: UserMessage.objects.filter(pk=1, is_public=True)),
+    ('random message probe',
+     lambda: UserMessage.objects.filter(is_public=True, id__gte=1).order_by('id')[:1]),
+    ('message feed first page',
+     lambda: UserMessage.objects.filter(is_public=True).order_by('-created_at', '-id')[:21]),
+    ('message feed after cursor',
+     lambda: UserMessage.objects.filter(is_public=True, created_at__lte=SAMPLE_CURSOR).filter(
+         Q(created_at__lt=SAMPLE_CURSOR) | Q(pk__lt=1)
+     ).order_by('-created_at', '-id')[:21]),
+    ('admin message changelist',
+     lambda: UserMessage.objects.order_by('-created_at', '-id')[:100]),
+]
+
+# Newest-first lists read their index in order and stop at the LIMIT, so an
+# index walk is what they should do; a table scan still fails them.
+ORDERED_INDEX_WALKS = {'message feed first page', 'admin message changelist'}
+INDEX_WALK_PATTERN = re.compile(r'\bSCAN \S+ USING (?:COVERING )?INDEX\b')
+
+FULL_SCAN_PATTERNS = {
+    # "SEARCH" means an index lookup; "SCAN" walks the whole table or index
+    'sqlite': re.compile(r'\bSCAN\b(?! CONSTANT ROW)'),
+    'postgresql': re.compile(r'\bSeq Scan\b'),
+}
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot ticket queries and fail if any of them needs a full scan'
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Query plan checks are not supported on {connection.vendor}.')
+
+        failures = []
+        for label, build_queryset in HOT_QUERIES:
+            plan = self.explain(build_queryset())
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{label}:\n{plan}\n')
+            if label in ORDERED_INDEX_WALKS:
+                plan = INDEX_WALK_PATTERN.sub('WALK', plan)
+            if pattern.search(plan):
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'FULL SCAN  {label}'))
+            else:
+                self.stdout.write(f'ok         {label}')
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries fall back to a full scan.')
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index'))
+
+    def explain(self, queryset):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables make a seq scan cheapest; ask whether an index *could* be used
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
@@ -1,20 +1,77 @@
-from django.core.management.base import BaseCommand
-from fundraising.models import Ticket
+import itertools
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from fundraising.availability import tickets_changed
+from fundraising.events import forget_event
+from fundraising.models import Event, Ticket
+from fundraising.services import record_created
+
+
+def insert_tickets(event, numbers, updated_at):
+    """
+    INSERT new AVAILABLE tickets with executemany. At this volume building
+    model instances for bulk_create costs far more than the INSERT itself.
+    """
+    fields = [Ticket._meta.get_field(name) for name in ('event', 'number', 'status', 'updated_at')]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(Ticket._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    updated_at = connection.ops.adapt_datetimefield_value(updated_at)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(event.id, number, 'AVAILABLE', updated_at) for number in numbers])
+
 
 class Command(BaseCommand):
-    help = 'Initialize 500 tickets'
-
-    def handle(self, *args, **kwargs):
-        tickets = []
-        existing = Ticket.objects.values_list('number', flat=True)
-        count = 0
-        for i in range(1, 501):
-            if i not in existing:
-                tickets.append(Ticket(number=i))
-                count += 1
-        
-        if tickets:
-            Ticket.objects.bulk_create(tickets)
-            self.stdout.write(self.style.SUCCESS(f'Successfully created {count} tickets'))
+    help = "Create an event's missing tickets, creating the event first if needed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', default=settings.DEFAULT_EVENT_SLUG, help='Event slug')
+        parser.add_argument('--name', help='Name of a new event (defaults to the slug)')
+        parser.add_argument('--count', type=int,
+                            help="Number of tickets, which sets the event's range (default: keep the range)")
+        parser.add_argument('--price', type=int, help='Price of one ticket in VND')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tickets per INSERT batch')
+
+    def handle(self, *args, **options):
+        if options['count'] is not None and options['count'] < 1:
+            raise CommandError('--count must be at least 1.')
+        batch_size = max(1, options['batch_size'])
+
+        event, _ = Event.objects.get_or_create(
+            slug=options['event'], defaults={'name': options['name'] or options['event']}
+        )
+        if options['count'] is not None:
+            event.last_number = event.first_number + options['count'] - 1
+        if options['price'] is not None:
+            event.price = options['price']
+        event.save()
+        forget_event(event.slug)
+
+        # Fetch the existing numbers once; each candidate is then a set lookup
+        existing = set(
+            Ticket.objects.filter(event=event).values_list('number', flat=True).iterator(chunk_size=batch_size)
+        )
+        missing = (number for number in event.ticket_range() if number not in existing)
+
+        created = 0
+        now = timezone.now()
+        with transaction.atomic():
+            while True:
+                batch = list(itertools.islice(missing, batch_size))
+                if not batch:
+                    break
+                insert_tickets(event, batch, now)
+                record_created(event.id, batch, 'init_tickets')
+                created += len(batch)
+            if created:
+                # Too many to list one by one; clients reload the statuses instead
+                tickets_changed(event.id, None)
+
+        if created:
+            self.stdout.write(self.style.SUCCESS(f'Successfully created {created} tickets for {event.slug}'))
         else:
-            self.stdout.write(self.style.SUCCESS('All tickets already exist'))
+            self.stdout.write(self.style.SUCCESS(f'All tickets for {event.slug} already exist'))
@@ -0,0 +1,54 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from fundraising.images import (
+    IMAGE_VARIANTS, SUPPORTED_FORMATS, image_cache, ticket_image_key, get_ticket_image_bytes,
+)
+from fundraising.models import Ticket
+
+
+def _render(job):
+    # Runs in a worker process; the image lands in the shared disk tier
+    get_ticket_image_bytes(*job)
+    return job
+
+
+class Command(BaseCommand):
+    help = 'Render every ticket image into the image cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes')
+        parser.add_argument('--variants', action='store_true',
+                            help='Also render every size variant in every supported format')
+
+    def handle(self, *args, **options):
+        if not image_cache.directory:
+            raise CommandError('TICKET_IMAGE_CACHE_DIR is not set, nothing to prerender into.')
+
+        kinds = [('full', 'jpeg')]
+        if options['variants']:
+            kinds = [(variant, fmt) for variant in IMAGE_VARIANTS for fmt in sorted(SUPPORTED_FORMATS)]
+
+        # Keys are content addressed, so a new template or font simply misses here
+        # Images depend only on the number, so a number used by several events renders once
+        jobs = [
+            (n, variant, fmt)
+            for n in Ticket.objects.order_by('number').values_list('number', flat=True).distinct()
+            for variant, fmt in kinds
+            if not image_cache.has_file(ticket_image_key(n, variant, fmt))
+        ]
+
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('All ticket images already cached'))
+            return
+
+        workers = max(1, options['workers'])
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(_render, jobs, chunksize=chunksize):
+                pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rendered {len(jobs)} ticket images with {workers} workers'
+        ))
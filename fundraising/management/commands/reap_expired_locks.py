@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from fundraising.reaper import release_expired_tickets, run_reaper
+
+
+class Command(BaseCommand):
+    help = 'Release expired ticket locks, once or on an interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.TICKET_REAPER_INTERVAL,
+                            help='Seconds between sweeps')
+        parser.add_argument('--once', action='store_true', help='Run a single sweep and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            released = release_expired_tickets()
+            self.stdout.write(self.style.SUCCESS(f'Released {released} expired ticket locks'))
+            return
+
+        self.stdout.write(f"Releasing expired ticket locks every {options['interval']}s")
+        try:
+            run_reaper(options['interval'])
+        except KeyboardInterrupt:
+            pass
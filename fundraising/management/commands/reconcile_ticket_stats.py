@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from fundraising.models import Event, Ticket
+from fundraising.services import reconcile, replayed_counts, status_counts, table_counts
+
+
+class Command(BaseCommand):
+    help = ("Compare each event's status counters and transition log with its tickets, "
+            "and optionally correct them from the tickets")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', help='Event slug (default: every event)')
+        parser.add_argument('--fix', action='store_true',
+                            help='Log correcting transitions and overwrite the counters '
+                                 'where they disagree with the tickets')
+
+    def handle(self, *args, **options):
+        events = Event.objects.order_by('id')
+        if options['event']:
+            events = events.filter(slug=options['event'])
+            if not events.exists():
+                raise CommandError(f"No event with slug {options['event']!r}.")
+
+        statuses = [status for status, _ in Ticket.STATUS_CHOICES]
+        self.stdout.write(f'{"event":<20}{"source":<10}' + ''.join(f'{status:>12}' for status in statuses))
+        mismatches = 0
+        for event in events:
+            actual = table_counts(event)
+            counters = status_counts(event)
+            replayed = replayed_counts(event)
+            for label, counts in (('tickets', actual), ('counters', counters), ('log', replayed)):
+                line = f'{event.slug:<20}{label:<10}' + ''.join(f'{counts[status]:>12}' for status in statuses)
+                self.stdout.write(line if counts == actual else self.style.ERROR(line))
+
+            if counters == actual and replayed == actual:
+                continue
+            if options['fix']:
+                fixed = reconcile(event)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{event.slug}: {fixed} tickets re-logged and counters reset from the tickets'))
+            else:
+                # Both are written with every change in fundraising.services; a gap means something bypassed it
+                mismatches += 1
+
+        if mismatches:
+            raise CommandError(f'{mismatches} mismatches found.')
+        self.stdout.write(self.style.SUCCESS('Counters and log match the tickets'))
@@ -0,0 +1,245 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from unittest import mock
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from fundraising.models import Event, Ticket
+from fundraising.services import record_created, replayed_counts, status_counts, table_counts
+
+
+def _stub_vietqr(amount, info):
+    # Stands in for api.vietqr.io, in case the remote fallback is reached, so the simulation runs offline
+    time.sleep(0.05)
+    return 'data:image/png;base64,'
+
+
+async def _astub_vietqr(amount, info):
+    return _stub_vietqr(amount, info)
+
+
+# A private in-process cache for the run, so the configured (possibly shared) one is never touched
+RUSH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'simulate_rush',
+    }
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Rush:
+    """
+    Shared state of one simulation run; every virtual buyer records into it.
+    """
+
+    def __init__(self, options, ticket_count):
+        self.options = options
+        self.ticket_count = ticket_count
+        self.hot_numbers = list(range(1, min(options['hot'], ticket_count) + 1))
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.conflicts = 0
+        self.sales = []
+        self._lock = threading.Lock()
+
+    def pick_numbers(self, rng):
+        numbers = set()
+        while len(numbers) < self.options['tickets_per_buyer']:
+            if rng.random() < self.options['overlap']:
+                numbers.add(rng.choice(self.hot_numbers))
+            else:
+                numbers.add(rng.randint(1, self.ticket_count))
+        return sorted(numbers)
+
+    def request(self, label, send):
+        started = time.perf_counter()
+        try:
+            response = send()
+        except Exception as e:
+            with self._lock:
+                self.errors[f'{label}: {type(e).__name__}: {e}'] += 1
+            return None
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[label].append(elapsed)
+        return response
+
+    def buyer(self, buyer_id):
+        rng = random.Random(self.options['seed'] + buyer_id)
+        client = Client()
+        name = f'Buyer {buyer_id}'
+        try:
+            for _ in range(self.options['rounds']):
+                self.request('index', lambda: client.get('/'))
+
+                numbers = self.pick_numbers(rng)
+                response = self.request('lock_tickets', lambda: client.post(
+                    '/lock/', {'ticket_numbers': [str(n) for n in numbers]}
+                ))
+                if response is None:
+                    continue
+                if response.status_code != 302 or response.url != '/checkout/':
+                    with self._lock:
+                        self.conflicts += 1
+                    continue
+
+                self.request('checkout GET', lambda: client.get('/checkout/'))
+
+                if rng.random() < self.options['cancel_rate']:
+                    self.request('cancel_checkout', lambda: client.get('/cancel-checkout/'))
+                    continue
+
+                response = self.request('checkout POST', lambda: client.post(
+                    '/checkout/', {'name': name, 'phone': '0912345678'}
+                ))
+                if response is not None and 'fundraising/success.html' in [t.name for t in response.templates]:
+                    with self._lock:
+                        self.sales.append((name, numbers))
+        finally:
+            connection.close()
+
+    def violations(self, event):
+        problems = []
+        owners = defaultdict(list)
+        for name, numbers in self.sales:
+            for number in numbers:
+                owners[number].append(name)
+
+        for number, names in sorted(owners.items()):
+            if len(names) > 1:
+                problems.append(f'ticket {number} sold to {len(names)} buyers: {", ".join(names)}')
+
+        sold = dict(Ticket.objects.filter(status='SOLD').values_list('number', 'buyer_name'))
+        for number, names in sorted(owners.items()):
+            if number not in sold:
+                problems.append(f'ticket {number} was sold to {names[0]} but is not SOLD')
+            elif len(names) == 1 and sold[number] != names[0]:
+                problems.append(f'ticket {number} was sold to {names[0]} but belongs to {sold[number]}')
+        for number in sorted(set(sold) - set(owners)):
+            problems.append(f'ticket {number} is SOLD without a completed checkout')
+
+        leaked = list(Ticket.objects.filter(status='LOCKED').values_list('number', flat=True))
+        if leaked:
+            problems.append(f'{len(leaked)} tickets still LOCKED after every buyer finished: {sorted(leaked)[:20]}')
+
+        actual = table_counts(event)
+        if status_counts(event) != actual:
+            problems.append(f'status counters {status_counts(event)} do not match the tickets {actual}')
+        if replayed_counts(event) != actual:
+            problems.append(f'replaying the transition log gives {replayed_counts(event)}, not {actual}')
+        return problems
+
+
+class Command(BaseCommand):
+    help = 'Drive concurrent virtual buyers through lock -> checkout -> sell on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=20, help='Concurrent virtual buyers')
+        parser.add_argument('--rounds', type=int, default=5, help='Purchase attempts per buyer')
+        parser.add_argument('--tickets', type=int, default=500, help='Tickets in the simulated raffle')
+        parser.add_argument('--tickets-per-buyer', type=int, default=3)
+        parser.add_argument('--hot', type=int, default=20,
+                            help='Size of the set of popular numbers')
+        parser.add_argument('--overlap', type=float, default=0.5,
+                            help='Probability that a pick comes from the popular numbers')
+        parser.add_argument('--cancel-rate', type=float, default=0.1,
+                            help='Probability that a buyer backs out at checkout')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['tickets_per_buyer'] > options['tickets']:
+            raise CommandError('--tickets-per-buyer cannot exceed --tickets.')
+
+        # Run against a throwaway test database so the real one is never touched.
+        # On SQLite it is file-backed, so the writer lock is contended as in production.
+        db_dir = tempfile.mkdtemp(prefix='simulate_rush_')
+        if connection.vendor == 'sqlite':
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(db_dir, 'rush.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cache_override = override_settings(CACHES=RUSH_CACHES)
+        cache_override.enable()
+
+        try:
+            # The buyers use the unprefixed URLs, i.e. the default event
+            event, _ = Event.objects.update_or_create(
+                slug=settings.DEFAULT_EVENT_SLUG,
+                defaults={'name': 'Rush', 'first_number': 1, 'last_number': options['tickets']},
+            )
+            Ticket.objects.bulk_create(
+                Ticket(event=event, number=n) for n in range(1, options['tickets'] + 1)
+            )
+            record_created(event.id, range(1, options['tickets'] + 1), 'simulate_rush')
+            rush = Rush(options, options['tickets'])
+
+            with mock.patch('fundraising.payments.fetch_remote_qr', _stub_vietqr), \
+                    mock.patch('fundraising.payments.afetch_remote_qr', _astub_vietqr):
+                threads = [
+                    threading.Thread(target=rush.buyer, args=(i,), name=f'buyer-{i}')
+                    for i in range(options['buyers'])
+                ]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+
+            problems = rush.violations(event)
+            self.report(rush, elapsed, problems)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(db_dir, ignore_errors=True)
+            cache_override.disable()
+
+        if problems:
+            raise CommandError(f'{len(problems)} invariant violations.')
+
+    def report(self, rush, elapsed, problems):
+        requests = sum(len(v) for v in rush.latencies.values())
+        tickets_sold = sum(len(numbers) for _, numbers in rush.sales)
+        self.stdout.write(f'Duration:        {elapsed:.2f}s')
+        self.stdout.write(f'Requests:        {requests} ({requests / elapsed:.1f}/s)')
+        self.stdout.write(f'Checkouts:       {len(rush.sales)} ({len(rush.sales) / elapsed:.1f}/s), '
+                          f'{tickets_sold} tickets sold')
+        self.stdout.write(f'Lock conflicts:  {rush.conflicts}')
+
+        self.stdout.write('')
+        self.stdout.write(f'{"view":<16}{"count":>7}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for label, values in rush.latencies.items():
+            values = sorted(values)
+            self.stdout.write(
+                f'{label:<16}{len(values):>7}'
+                f'{percentile(values, 50) * 1000:>10.1f}'
+                f'{percentile(values, 95) * 1000:>10.1f}'
+                f'{percentile(values, 99) * 1000:>10.1f}'
+            )
+
+        if rush.errors:
+            self.stdout.write('')
+            self.stdout.write(self.style.ERROR('Errors:'))
+            for error, count in rush.errors.most_common():
+                self.stdout.write(f'  {count:>5}  {error}')
+
+        self.stdout.write('')
+        if problems:
+            self.stdout.write(self.style.ERROR('Invariant violations:'))
+            for problem in problems:
+                self.stdout.write(f'  {problem}')
+        else:
+            self.stdout.write(self.style.SUCCESS('No double sales or leaked locks'))
@@ -0,0 +1,169 @@
+"""
+Write-behind ingestion for user messages.
+
+submit_message hands messages to a bounded in-process queue and returns at
+once; a background thread inserts them with bulk_create in batches of up to
+MESSAGE_BATCH_SIZE, or whatever arrived within MESSAGE_FLUSH_INTERVAL. A full
+queue is reported to the caller so the view can answer 429. Messages still
+queued when the process is killed are lost, so the mode is opt-in.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, close_old_connections, transaction
+from . import metrics
+from .message_feed import forget_first_page
+from .message_pool import add_to_pool
+from .models import UserMessage
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_ACCEPTED = metrics.Counter(
+    'fundraising_messages_accepted_total', 'Messages queued for a buffered insert.')
+MESSAGES_REJECTED = metrics.Counter(
+    'fundraising_messages_rejected_total', 'Messages turned away because the buffer was full.')
+MESSAGES_FLUSHED = metrics.Counter(
+    'fundraising_messages_flushed_total', 'Buffered messages written to the database.')
+MESSAGE_FLUSH_FAILURES = metrics.Counter(
+    'fundraising_message_flush_failures_total', 'Batch inserts that failed and were retried.')
+MESSAGES_DROPPED = metrics.Counter(
+    'fundraising_messages_dropped_total', 'Buffered messages the database rejected, which were dropped.')
+MESSAGE_FLUSH_DURATION = metrics.Histogram(
+    'fundraising_message_flush_seconds', 'Time taken by one batch insert.')
+MESSAGE_DELAY = metrics.Histogram(
+    'fundraising_message_delay_seconds', 'Time from accepting a message to its insert.')
+MESSAGE_QUEUE_DEPTH = metrics.Gauge(
+    'fundraising_message_queue_depth', 'Messages waiting in the buffer.')
+
+
+class MessageBuffer:
+    """Bounded queue of unsaved messages drained by one flusher thread."""
+
+    def __init__(self, max_size, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def put(self, name, phone, message):
+        """Queue a message; returns False when the buffer is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.monotonic(), UserMessage(name=name, phone=phone, message=message)))
+        except queue.Full:
+            MESSAGES_REJECTED.inc()
+            return False
+        MESSAGES_ACCEPTED.inc()
+        MESSAGE_QUEUE_DEPTH.set(self._queue.qsize())
+        return True
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._thread is None:
+                atexit.register(self.stop)
+            else:
+                logger.error('Message flusher thread died, restarting it')
+            self._thread = threading.Thread(target=self._run, name='message-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Flush what is queued and stop the thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _next_batch(self):
+        # Wait for a first message, then collect more until the batch is full or the interval ends
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        batch = []
+        while not (self._stop.is_set() and not batch and self._queue.empty()):
+            if not batch:
+                batch = self._next_batch()
+                if not batch:
+                    continue
+            close_old_connections()
+            try:
+                batch = self._write(batch)
+            except Exception:
+                # Neither retry an unknown failure forever nor let it end the thread
+                MESSAGES_DROPPED.inc(len(batch))
+                logger.exception('Dropped %d buffered messages', len(batch))
+                batch = []
+                continue
+            if batch:
+                # Keep the rest and retry; the queue fills up and callers get 429 meanwhile
+                MESSAGE_FLUSH_FAILURES.inc()
+                if self._stop.wait(self.flush_interval):
+                    break
+        close_old_connections()
+
+    def _write(self, batch):
+        """
+        Insert a batch. A row the database rejects fails the whole INSERT, so
+        the batch is then inserted row by row and the rejected rows dropped.
+        Returns the messages still to insert when the database is unavailable.
+        """
+        try:
+            self.flush(batch)
+            return []
+        except (DataError, IntegrityError):
+            logger.warning('Inserting %d buffered messages one by one after a rejected batch', len(batch))
+        except DatabaseError:
+            logger.exception('Failed to insert %d buffered messages', len(batch))
+            return batch
+
+        for i, item in enumerate(batch):
+            try:
+                self.flush([item])
+            except (DataError, IntegrityError):
+                MESSAGES_DROPPED.inc()
+                logger.exception('Dropped a buffered message the database rejected')
+            except DatabaseError:
+                logger.exception('Failed to insert %d buffered messages', len(batch) - i)
+                return batch[i:]
+        return []
+
+    def flush(self, batch):
+        started = time.perf_counter()
+        # Its own transaction, or a savepoint when called inside one, so a rejected row can be retried alone
+        with transaction.atomic():
+            messages = UserMessage.objects.bulk_create([message for _, message in batch])
+        finished = time.monotonic()
+        MESSAGE_FLUSH_DURATION.observe(time.perf_counter() - started)
+        MESSAGES_FLUSHED.inc(len(messages))
+        MESSAGE_QUEUE_DEPTH.set(self._queue.qsize())
+        for accepted_at, _ in batch:
+            MESSAGE_DELAY.observe(finished - accepted_at)
+        for message in messages:
+            if message.pk is not None and message.is_public:
+                add_to_pool(message.pk)
+        forget_first_page()
+
+
+message_buffer = MessageBuffer(
+    settings.MESSAGE_BUFFER_SIZE,
+    settings.MESSAGE_BATCH_SIZE,
+    settings.MESSAGE_FLUSH_INTERVAL,
+)
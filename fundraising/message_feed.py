@@ -0,0 +1,68 @@
+import base64
+from datetime import datetime
+from django.core.cache import cache
+from django.db.models import Q
+from .models import UserMessage
+
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 100
+FIRST_PAGE_KEY = 'message_feed:first'
+FIRST_PAGE_TIMEOUT = 60
+
+
+def encode_cursor(message):
+    value = f'{message.created_at.isoformat()}|{message.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError for anything malformed."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _load_page(cursor, limit):
+    # Seeks into the public feed index instead of skipping rows with OFFSET
+    messages = UserMessage.objects.filter(is_public=True)
+    if cursor is not None:
+        created_at, pk = cursor
+        # The bare <= gives the planner a range to seek to; the OR breaks ties on id
+        messages = messages.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(pk__lt=pk))
+    # One extra row tells whether there is a next page
+    rows = list(messages.order_by('-created_at', '-id').only('message', 'created_at')[:limit + 1])
+    page = rows[:limit]
+    return {
+        'messages': [
+            {'id': m.pk, 'message': m.message, 'created_at': m.created_at.isoformat()}
+            for m in page
+        ],
+        'next': encode_cursor(page[-1]) if len(rows) > limit else None,
+    }
+
+
+def get_feed_page(cursor=None, limit=FEED_PAGE_SIZE):
+    """
+    One page of public messages, newest first. `cursor` is the `next` value
+    of the previous page. The default-sized first page, which every visitor
+    asks for, is cached until a message is added.
+    """
+    limit = max(1, min(limit, MAX_FEED_PAGE_SIZE))
+    if cursor:
+        return _load_page(decode_cursor(cursor), limit)
+    if limit != FEED_PAGE_SIZE:
+        return _load_page(None, limit)
+
+    page = cache.get(FIRST_PAGE_KEY)
+    if page is None:
+        page = _load_page(None, limit)
+        cache.set(FIRST_PAGE_KEY, page, FIRST_PAGE_TIMEOUT)
+    return page
+
+
+def forget_first_page():
+    """Drop the cached first page; call after adding, hiding or deleting messages."""
+    cache.delete(FIRST_PAGE_KEY)
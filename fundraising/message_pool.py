@@ -0,0 +1,59 @@
+import random
+from django.core.cache import cache
+from django.db.models import Max
+from .models import UserMessage
+
+POOL_KEY = 'public_message_pool'
+POOL_SIZE = 1000
+POOL_TIMEOUT = 60 * 60
+
+
+def _load_pool():
+    # Newest public messages; walks the primary key backwards and stops at POOL_SIZE
+    ids = list(
+        UserMessage.objects.filter(is_public=True)
+        .order_by('-id')
+        .values_list('id', flat=True)[:POOL_SIZE]
+    )
+    cache.set(POOL_KEY, ids, POOL_TIMEOUT)
+    return ids
+
+
+def add_to_pool(message_id):
+    """
+    Put a newly created public message into the pool, rotating out the oldest.
+    """
+    ids = cache.get(POOL_KEY)
+    if ids is None:
+        # Not loaded yet; the next read picks the message up from the table
+        return
+    cache.set(POOL_KEY, [message_id] + ids[:POOL_SIZE - 1], POOL_TIMEOUT)
+
+
+def _probe_random_message():
+    # Jump to a random point in the id range and take the next public message
+    max_id = UserMessage.objects.aggregate(max_id=Max('id'))['max_id']
+    if max_id is None:
+        return None
+    pivot = random.randint(1, max_id)
+    public = UserMessage.objects.filter(is_public=True)
+    return (
+        public.filter(id__gte=pivot).order_by('id').first()
+        or public.filter(id__lt=pivot).order_by('-id').first()
+    )
+
+
+def random_public_message():
+    """
+    Return a random public message with a primary key lookup, whatever the table size.
+    """
+    ids = cache.get(POOL_KEY)
+    if ids is None:
+        ids = _load_pool()
+
+    if ids:
+        # The pool may hold a message that was hidden or deleted since
+        message = UserMessage.objects.filter(pk=random.choice(ids), is_public=True).first()
+        if message is not None:
+            return message
+    return _probe_random_message()
@@ -0,0 +1,226 @@
+"""
+Small in-process metrics registry with Prometheus text output.
+
+Each process keeps its own values and, when METRICS_DIR is set, periodically
+writes them to <METRICS_DIR>/metrics_<pid>.json; /metrics sums the files of
+all gunicorn workers. Counters and histograms from exited workers are kept so
+totals do not drop; gauges only count live processes.
+"""
+import functools
+import glob
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from django.conf import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_metrics = {}
+_values = {}
+_last_flush = 0.0
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        _metrics[name] = self
+
+    def _key(self, labels):
+        return (self.name, tuple(sorted(labels.items())))
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with _lock:
+            _values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # Per-bucket counts plus +Inf, then sum; the total count is derived
+            state = _values.get(key)
+            if state is None:
+                state = _values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+
+REQUEST_DURATION = Histogram(
+    'fundraising_request_duration_seconds', 'Time spent in the view, by URL name.')
+REQUEST_QUERIES = Histogram(
+    'fundraising_request_queries', 'SQL queries per request, by URL name.', QUERY_COUNT_BUCKETS)
+REQUEST_DB_DURATION = Histogram(
+    'fundraising_request_db_seconds', 'Time spent in SQL per request, by URL name.')
+OPERATION_DURATION = Histogram(
+    'fundraising_operation_duration_seconds', 'Duration of timed operations such as rendering and external calls.')
+
+
+def timed(operation):
+    """
+    Decorator recording how long each call takes under the given operation
+    label. Coroutine functions are timed until the awaited result.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    OPERATION_DURATION.observe(time.perf_counter() - started, operation=operation)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                OPERATION_DURATION.observe(time.perf_counter() - started, operation=operation)
+        return wrapper
+    return decorator
+
+
+def _local_values():
+    with _lock:
+        return [
+            [name, dict(labels), value[:] if isinstance(value, list) else value]
+            for (name, labels), value in _values.items()
+        ]
+
+
+def _store_path(pid):
+    return os.path.join(settings.METRICS_DIR, f'metrics_{pid}.json')
+
+
+def flush(force=False):
+    """Write this process's values to the shared directory, at most once per interval."""
+    global _last_flush
+    if not settings.METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = _store_path(os.getpid())
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(_local_values(), f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect():
+    """Values from every process, with this process's taken live."""
+    sources = [_local_values()]
+    if settings.METRICS_DIR:
+        own_path = _store_path(os.getpid())
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics_*.json')):
+            if path == own_path:
+                continue
+            try:
+                with open(path) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+            alive = _pid_alive(pid)
+            sources.append([
+                entry for entry in entries
+                if alive or getattr(_metrics.get(entry[0]), 'kind', None) != 'gauge'
+            ])
+
+    merged = {}
+    for entries in sources:
+        for name, labels, value in entries:
+            key = (name, tuple(sorted(labels.items())))
+            current = merged.get(key)
+            if current is None:
+                merged[key] = value[:] if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = current + value
+    return merged
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    merged = _collect()
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        series = sorted((labels, value) for (metric_name, labels), value in merged.items() if metric_name == name)
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, value in series:
+            if metric.kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                cumulative += count
+                bucket_labels = labels + (('le', _format_number(float(bound))),)
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(value[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
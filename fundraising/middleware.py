@@ -0,0 +1,129 @@
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+from . import metrics
+
+logger = logging.getLogger('fundraising.slow_requests')
+
+SLOW_REQUEST_MAX_QUERIES = 20
+
+
+class _QueryRecorder:
+    """execute_wrapper that counts and times the SQL run during one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.queries.append((elapsed, sql))
+
+
+def _add_execute_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+def _remove_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+class MetricsMiddleware:
+    """
+    Record per-view duration, query count and DB time, and log slow requests
+    together with the SQL they ran. Runs natively under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        self.record(request, time.perf_counter() - started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+        # Connections are per thread, and the async ORM runs this request's
+        # queries in its own sync thread, so the wrapper is installed there
+        await sync_to_async(_add_execute_wrapper)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_remove_execute_wrapper)(recorder)
+        self.record(request, time.perf_counter() - started, recorder)
+        return response
+
+    def record(self, request, duration, recorder):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        metrics.REQUEST_DURATION.observe(duration, view=view)
+        metrics.REQUEST_QUERIES.observe(recorder.count, view=view)
+        metrics.REQUEST_DB_DURATION.observe(recorder.duration, view=view)
+
+        if duration >= settings.SLOW_REQUEST_SECONDS:
+            self.log_slow_request(request, duration, recorder)
+
+        metrics.flush()
+
+    def log_slow_request(self, request, duration, recorder):
+        slowest = sorted(recorder.queries, key=lambda q: q[0], reverse=True)[:SLOW_REQUEST_MAX_QUERIES]
+        logger.warning(
+            'Slow request %s %s: %.3fs, %d queries, %.3fs in DB\n%s',
+            request.method,
+            request.path,
+            duration,
+            recorder.count,
+            recorder.duration,
+            '\n'.join(f'  {elapsed * 1000:8.1f} ms  {sql}' for elapsed, sql in slowest),
+        )
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that can also run async. WhiteNoise itself is sync
+    only, and one sync middleware makes Django hold a thread for every ASGI
+    request, async views included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens the file; the body is streamed by the handler
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+import fundraising.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fundraising', '0004_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('first_number', models.PositiveIntegerField(default=1)),
+                ('last_number', models.PositiveIntegerField(default=500)),
+                ('price', models.PositiveIntegerField(default=10000, help_text='Price of one ticket in VND')),
+                ('lock_seconds', models.PositiveIntegerField(default=fundraising.models.default_lock_seconds, help_text='How long a checkout holds its tickets')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # Nullable until the existing rows are given the default event in 0006
+        migrations.AddField(
+            model_name='reservation',
+            name='event',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='fundraising.event'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='event',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tickets', to='fundraising.event'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Max, Min
+
+
+def create_default_event(apps, schema_editor):
+    """Put every existing ticket and reservation into the default event."""
+    Event = apps.get_model('fundraising', 'Event')
+    Ticket = apps.get_model('fundraising', 'Ticket')
+    Reservation = apps.get_model('fundraising', 'Reservation')
+    db = schema_editor.connection.alias
+
+    numbers = Ticket.objects.using(db).aggregate(first=Min('number'), last=Max('number'))
+    event, _ = Event.objects.using(db).get_or_create(
+        slug=settings.DEFAULT_EVENT_SLUG,
+        defaults={
+            'name': 'Vé số gây quỹ',
+            'first_number': numbers['first'] or 1,
+            'last_number': numbers['last'] or 500,
+            'price': 10000,
+            'lock_seconds': settings.TICKET_LOCK_SECONDS,
+        },
+    )
+    Ticket.objects.using(db).filter(event__isnull=True).update(event=event)
+    Reservation.objects.using(db).filter(event__isnull=True).update(event=event)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fundraising', '0005_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_event, migrations.RunPython.noop),
+    ]
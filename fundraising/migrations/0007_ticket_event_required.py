@@ -0,0 +1,47 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fundraising', '0006_default_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='fundraising.event'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='tickets', to='fundraising.event'),
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_status_number_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_locked_expiry_idx',
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='number',
+            field=models.PositiveIntegerField(help_text='Ticket number, unique within its event'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(fields=('event', 'number'), name='ticket_event_number_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'status', 'number'], name='ticket_event_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'LOCKED')), fields=['event', 'locked_at'], name='ticket_event_locked_idx'),
+        ),
+    ]
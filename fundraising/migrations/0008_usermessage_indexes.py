@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fundraising', '0007_ticket_event_required'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at', '-id'], name='usermessage_public_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermessage',
+            index=models.Index(fields=['-created_at', '-id'], name='usermessage_created_idx'),
+        ),
+    ]
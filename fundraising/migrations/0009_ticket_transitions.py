@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fundraising', '0008_usermessage_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Available'), ('LOCKED', 'Locked'), ('SOLD', 'Sold')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_counters', to='fundraising.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'status'), name='status_counter_event_status_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('from_status', models.CharField(blank=True, choices=[('AVAILABLE', 'Available'), ('LOCKED', 'Locked'), ('SOLD', 'Sold')], max_length=20, null=True)),
+                ('to_status', models.CharField(blank=True, choices=[('AVAILABLE', 'Available'), ('LOCKED', 'Locked'), ('SOLD', 'Sold')], max_length=20, null=True)),
+                ('source', models.CharField(max_length=30)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='fundraising.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'number', 'id'], name='transition_event_number_idx')],
+            },
+        ),
+    ]
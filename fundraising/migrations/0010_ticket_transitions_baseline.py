@@ -0,0 +1,45 @@
+from django.db import migrations
+from django.db.models import Count
+
+BATCH_SIZE = 5000
+
+
+def record_existing_tickets(apps, schema_editor):
+    """
+    Log every existing ticket as created in its current status and count
+    them, so replaying the log and the counters both match the table.
+    """
+    Ticket = apps.get_model('fundraising', 'Ticket')
+    TicketTransition = apps.get_model('fundraising', 'TicketTransition')
+    StatusCounter = apps.get_model('fundraising', 'StatusCounter')
+    db = schema_editor.connection.alias
+
+    rows = Ticket.objects.using(db).order_by('event', 'number').values_list('event_id', 'number', 'status')
+    batch = []
+    for event_id, number, status in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TicketTransition(event_id=event_id, number=number, to_status=status, source='migration'))
+        if len(batch) >= BATCH_SIZE:
+            TicketTransition.objects.using(db).bulk_create(batch)
+            batch = []
+    TicketTransition.objects.using(db).bulk_create(batch)
+
+    counts = Ticket.objects.using(db).values('event_id', 'status').annotate(count=Count('id')).order_by()
+    StatusCounter.objects.using(db).bulk_create(
+        StatusCounter(event_id=row['event_id'], status=row['status'], count=row['count']) for row in counts
+    )
+
+
+def forget_existing_tickets(apps, schema_editor):
+    apps.get_model('fundraising', 'TicketTransition').objects.using(schema_editor.connection.alias).delete()
+    apps.get_model('fundraising', 'StatusCounter').objects.using(schema_editor.connection.alias).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fundraising', '0009_ticket_transitions'),
+    ]
+
+    operations = [
+        migrations.RunPython(record_existing_tickets, forget_existing_tickets),
+    ]
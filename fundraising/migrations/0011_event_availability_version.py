@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:21
+
+import fundraising.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fundraising', '0010_ticket_transitions_baseline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='availability_version',
+            field=models.BigIntegerField(default=fundraising.models.initial_availability_version, editable=False),
+        ),
+    ]
@@ -1,6 +1,92 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+import time
 import uuid
 
+
+def lock_expiry_threshold(lock_seconds=None):
+    """Locks taken before this moment have expired."""
+    if lock_seconds is None:
+        lock_seconds = settings.TICKET_LOCK_SECONDS
+    return timezone.now() - timedelta(seconds=lock_seconds)
+
+
+def default_lock_seconds():
+    return settings.TICKET_LOCK_SECONDS
+
+
+def initial_availability_version():
+    # From the clock, so a new event's versions never go backwards for a client
+    return int(time.time() * 1000)
+
+
+class Event(models.Model):
+    """
+    One raffle, with its own range of ticket numbers, price and lock window.
+    """
+    slug = models.SlugField(unique=True)
+    name = models.CharField(max_length=255)
+    first_number = models.PositiveIntegerField(default=1)
+    last_number = models.PositiveIntegerField(default=500)
+    price = models.PositiveIntegerField(default=10000, help_text="Price of one ticket in VND")
+    lock_seconds = models.PositiveIntegerField(
+        default=default_lock_seconds, help_text="How long a checkout holds its tickets"
+    )
+    # Bumped in the same transaction as every ticket change; see availability.py
+    availability_version = models.BigIntegerField(default=initial_availability_version, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        # Never write back a stale availability_version, e.g. from the admin or a cached instance
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'availability_version'
+            ]
+        super().save(*args, **kwargs)
+
+    def ticket_range(self):
+        return range(self.first_number, self.last_number + 1)
+
+
+class TicketQuerySet(models.QuerySet):
+    # lock_seconds is the event's lock window; filter on that event as well
+
+    def expired_locks(self, lock_seconds=None):
+        return self.filter(status='LOCKED', locked_at__lt=lock_expiry_threshold(lock_seconds))
+
+    def claimable(self, lock_seconds=None):
+        """Available tickets, plus locked ones whose lock has expired but not been reaped yet."""
+        return self.filter(
+            Q(status='AVAILABLE') | Q(status='LOCKED', locked_at__lt=lock_expiry_threshold(lock_seconds))
+        )
+
+
+class Reservation(models.Model):
+    """
+    A buyer's hold on a set of tickets, from lock_tickets until checkout.
+    The token is kept in the buyer's session.
+    """
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='reservations')
+    session_key = models.CharField(max_length=40)
+    ticket_numbers = models.JSONField(default=list)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reservation {self.token} - {len(self.ticket_numbers)} tickets"
+
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
 class Ticket(models.Model):
     STATUS_CHOICES = [
         ('AVAILABLE', 'Available'),
@@ -8,7 +94,8 @@ class Ticket(models.Model):
         ('SOLD', 'Sold'),
     ]
 
-    number = models.PositiveIntegerField(unique=True, help_text="Ticket number from 1 to 500")
+    event = models.ForeignKey(Event, on_delete=models.PROTECT, related_name='tickets')
+    number = models.PositiveIntegerField(help_text="Ticket number, unique within its event")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='AVAILABLE')
     
     # Buyer Info (only filled when sold or pending payment)
@@ -19,13 +106,75 @@ class Ticket(models.Model):
     # We might want a session ID or similar, but for simplicity we rely on status.
     # locked_at can help cleanup stale locks.
     locked_at = models.DateTimeField(blank=True, null=True)
+    reservation = models.ForeignKey(
+        Reservation, blank=True, null=True, on_delete=models.SET_NULL, related_name='tickets'
+    )
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TicketQuerySet.as_manager()
+
     def __str__(self):
         return f"Ticket #{self.number} - {self.status}"
 
     class Meta:
         ordering = ['number']
+        constraints = [
+            # Also the index for looking tickets up by number within an event
+            models.UniqueConstraint(fields=['event', 'number'], name='ticket_event_number_uniq'),
+        ]
+        indexes = [
+            # Grid and admin: one event's tickets by status, ordered by number
+            models.Index(fields=['event', 'status', 'number'], name='ticket_event_status_idx'),
+            # Lock expiry only ever looks at LOCKED rows; backends without
+            # partial indexes skip this one
+            models.Index(
+                fields=['event', 'locked_at'],
+                name='ticket_event_locked_idx',
+                condition=Q(status='LOCKED'),
+            ),
+        ]
+
+class TicketTransition(models.Model):
+    """
+    One ticket status change, written by fundraising.services in the same
+    transaction as the change itself. Rows are only ever added. from_status
+    is empty for a ticket being created, to_status for one being deleted.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='transitions', db_index=False)
+    number = models.PositiveIntegerField()
+    from_status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES, blank=True, null=True)
+    to_status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES, blank=True, null=True)
+    # What made the change: lock, checkout, cancel_checkout, reaper, admin, ...
+    source = models.CharField(max_length=30)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Ticket #{self.number}: {self.from_status or '-'} -> {self.to_status or '-'}"
+
+    class Meta:
+        indexes = [
+            # One ticket's history, and the whole log of one event
+            models.Index(fields=['event', 'number', 'id'], name='transition_event_number_idx'),
+        ]
+
+
+class StatusCounter(models.Model):
+    """
+    Number of an event's tickets in one status, kept in step with every
+    TicketTransition so totals are read without scanning the tickets.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='status_counters', db_index=False)
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.event}: {self.count} {self.status}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'status'], name='status_counter_event_status_uniq'),
+        ]
+
 
 class UserMessage(models.Model):
     name = models.CharField(max_length=255)
@@ -34,5 +183,17 @@ class UserMessage(models.Model):
     is_public = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Public feed: newest first, walked with a (created_at, id) cursor
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='usermessage_public_feed_idx',
+                condition=Q(is_public=True),
+            ),
+            # Admin changelist, which orders by -created_at then -pk
+            models.Index(fields=['-created_at', '-id'], name='usermessage_created_idx'),
+        ]
+
     def __str__(self):
         return f"Message from {self.name} - {self.phone}"
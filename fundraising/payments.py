@@ -0,0 +1,231 @@
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import threading
+import unicodedata
+import weakref
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+from .images import run_in_render_pool
+from .metrics import timed
+
+try:
+    import qrcode
+except ImportError:  # Only the remote API can be used then
+    qrcode = None
+
+try:
+    import httpx
+except ImportError:  # Async callers then reach the API through requests in a thread
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+VIETQR_API_URL = 'https://api.vietqr.io/v2/generate'
+QR_CACHE_TIMEOUT = 60 * 60 * 24
+
+# EMVCo merchant-presented QR fields as profiled by NAPAS for VietQR
+NAPAS_GUID = 'A000000727'
+SERVICE_TRANSFER_TO_ACCOUNT = 'QRIBFTTA'
+CURRENCY_VND = '704'
+COUNTRY_VN = 'VN'
+MAX_INFO_LENGTH = 50
+
+
+def _tlv(tag, value):
+    return f'{tag}{len(value):02d}{value}'
+
+
+def crc16_ccitt(data):
+    """CRC-16/CCITT-FALSE, the checksum EMVCo QR payloads end with."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return crc
+
+
+def _ascii_text(text):
+    # Banking apps expect plain ASCII in the transfer note
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ''.join(c for c in text if 32 <= ord(c) < 127).strip()
+
+
+def build_vietqr_payload(bank_bin, account_no, amount, info=''):
+    """
+    Build the VietQR (EMVCo) string for a transfer of `amount` VND to the account.
+    """
+    beneficiary = _tlv('00', bank_bin) + _tlv('01', str(account_no))
+    merchant_account = (
+        _tlv('00', NAPAS_GUID)
+        + _tlv('01', beneficiary)
+        + _tlv('02', SERVICE_TRANSFER_TO_ACCOUNT)
+    )
+    payload = (
+        _tlv('00', '01')        # payload format indicator
+        + _tlv('01', '12')      # dynamic QR: amount is fixed
+        + _tlv('38', merchant_account)
+        + _tlv('53', CURRENCY_VND)
+        + _tlv('54', str(int(amount)))
+        + _tlv('58', COUNTRY_VN)
+    )
+    info = _ascii_text(info)[:MAX_INFO_LENGTH]
+    if info:
+        payload += _tlv('62', _tlv('08', info))
+
+    payload += '6304'
+    return payload + f'{crc16_ccitt(payload.encode()):04X}'
+
+
+@timed('vietqr_local')
+def render_local_qr(payload):
+    """Render the payload as a PNG data URL, like the API's qrDataURL."""
+    img = qrcode.make(payload, box_size=8, border=2)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+_session = None
+_session_lock = threading.Lock()
+# One async client per event loop; a client cannot be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+REMOTE_ERRORS = (requests.RequestException, ValueError) + ((httpx.HTTPError,) if httpx else ())
+
+
+def _get_session():
+    # One pooled session per process so connections to the API are reused
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(
+                pool_maxsize=settings.VIETQR_POOL_SIZE,
+                max_retries=0,
+            ))
+            _session = session
+        return _session
+
+
+def _get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=settings.VIETQR_POOL_SIZE),
+            timeout=httpx.Timeout(settings.VIETQR_READ_TIMEOUT, connect=settings.VIETQR_CONNECT_TIMEOUT),
+        )
+    return client
+
+
+def _remote_request(amount, info):
+    # (JSON body, headers) of a VietQR API generate call
+    payload = {
+        "accountNo": int(settings.VIETQR_ACCOUNT_NO),
+        "accountName": settings.VIETQR_ACCOUNT_NAME,
+        "acqId": int(settings.VIETQR_BANK_BIN),
+        "amount": amount,
+        "addInfo": info,
+        "format": "text",
+        "template": "compact2"
+    }
+    headers = {
+        "x-client-id": settings.VIETQR_CLIENT_ID,
+        "x-api-key": settings.VIETQR_API_KEY,
+        "Content-Type": "application/json"
+    }
+    # Unset credentials are left out, as requests does with None values
+    return payload, {name: value for name, value in headers.items() if value is not None}
+
+
+def _remote_qr_url(data):
+    if data.get("code") == "00":
+        return data.get("data", {}).get("qrDataURL")
+    return None
+
+
+@timed('vietqr_api')
+def fetch_remote_qr(amount, info):
+    payload, headers = _remote_request(amount, info)
+    response = _get_session().post(
+        VIETQR_API_URL,
+        json=payload,
+        headers=headers,
+        timeout=(settings.VIETQR_CONNECT_TIMEOUT, settings.VIETQR_READ_TIMEOUT),
+    )
+    return _remote_qr_url(response.json())
+
+
+@timed('vietqr_api')
+async def afetch_remote_qr(amount, info):
+    if httpx is None:
+        return await sync_to_async(fetch_remote_qr, thread_sensitive=False)(amount, info)
+    payload, headers = _remote_request(amount, info)
+    response = await _get_async_client().post(VIETQR_API_URL, json=payload, headers=headers)
+    return _remote_qr_url(response.json())
+
+
+def _qr_cache_key(amount, info):
+    return 'vietqr:' + hashlib.sha256(f'{amount}:{info}'.encode()).hexdigest()
+
+
+def get_payment_qr(amount, info):
+    """
+    Return a QR image (data URL) for paying `amount` with the transfer note `info`.
+    Generated in-process and cached; the VietQR API is only a fallback.
+    """
+    key = _qr_cache_key(amount, info)
+    qr_url = cache.get(key)
+    if qr_url:
+        return qr_url
+
+    if qrcode is not None:
+        payload = build_vietqr_payload(
+            settings.VIETQR_BANK_BIN, settings.VIETQR_ACCOUNT_NO, amount, info
+        )
+        qr_url = render_local_qr(payload)
+    elif settings.VIETQR_REMOTE_FALLBACK:
+        try:
+            qr_url = fetch_remote_qr(amount, info)
+        except REMOTE_ERRORS as e:
+            logger.warning('Error generating QR: %s', e)
+
+    if qr_url:
+        cache.set(key, qr_url, QR_CACHE_TIMEOUT)
+    return qr_url
+
+
+async def aget_payment_qr(amount, info):
+    """
+    get_payment_qr for async views: the QR is drawn on the render pool and
+    the API call is awaited, so no request thread waits on either.
+    """
+    key = _qr_cache_key(amount, info)
+    qr_url = await cache.aget(key)
+    if qr_url:
+        return qr_url
+
+    if qrcode is not None:
+        payload = build_vietqr_payload(
+            settings.VIETQR_BANK_BIN, settings.VIETQR_ACCOUNT_NO, amount, info
+        )
+        qr_url = await run_in_render_pool(render_local_qr, payload)
+    elif settings.VIETQR_REMOTE_FALLBACK:
+        try:
+            qr_url = await afetch_remote_qr(amount, info)
+        except REMOTE_ERRORS as e:
+            logger.warning('Error generating QR: %s', e)
+
+    if qr_url:
+        await cache.aset(key, qr_url, QR_CACHE_TIMEOUT)
+    return qr_url
@@ -0,0 +1,66 @@
+import logging
+import threading
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+from .models import Event, Reservation, Ticket
+from .services import transition_tickets
+
+logger = logging.getLogger(__name__)
+
+
+def release_expired_tickets():
+    """
+    Return tickets whose lock has expired to AVAILABLE, event by event since
+    each has its own lock window. Returns how many were released.
+    """
+    released = 0
+    for event in Event.objects.all():
+        released += transition_tickets(
+            Ticket.objects.filter(event=event).expired_locks(event.lock_seconds), 'AVAILABLE', 'reaper',
+            locked_at=None, reservation=None,
+        )
+
+    # Reservations that ran out without a sale are no longer needed
+    Reservation.objects.filter(expires_at__lt=timezone.now()).exclude(tickets__status='SOLD').delete()
+    return released
+
+
+def run_reaper(interval, stop_event=None):
+    """
+    Release expired locks every `interval` seconds until `stop_event` is set.
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            released = release_expired_tickets()
+            if released:
+                logger.info('Released %s expired ticket locks', released)
+        except DatabaseError:
+            logger.exception('Failed to release expired ticket locks')
+        stop_event.wait(interval)
+
+
+_reaper_thread = None
+_reaper_lock = threading.Lock()
+
+
+def start_reaper_thread(**kwargs):
+    """
+    Run the reaper in a daemon thread of this process, once. Connected to
+    request_started when TICKET_REAPER_THREAD is set.
+    """
+    global _reaper_thread
+    if _reaper_thread is not None:
+        return _reaper_thread
+    with _reaper_lock:
+        if _reaper_thread is None:
+            _reaper_thread = threading.Thread(
+                target=run_reaper,
+                args=(settings.TICKET_REAPER_INTERVAL,),
+                name='ticket-lock-reaper',
+                daemon=True,
+            )
+            _reaper_thread.start()
+        return _reaper_thread
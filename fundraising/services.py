@@ -0,0 +1,210 @@
+"""
+Ticket status changes.
+
+Everything that moves a ticket between statuses goes through here: each
+change is appended to TicketTransition and applied to StatusCounter in the
+same transaction as the ticket update, and pushed to the grid on commit.
+Totals then come from the counters instead of scanning the tickets.
+"""
+from collections import Counter, defaultdict
+from itertools import zip_longest
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .availability import tickets_changed
+from .models import StatusCounter, Ticket, TicketTransition
+
+# Rows per UPDATE/DELETE ... WHERE id IN (...), to stay under the parameter limit
+TICKET_BATCH_SIZE = 500
+TRANSITION_FIELDS = ('event', 'number', 'from_status', 'to_status', 'source', 'created_at')
+
+
+def _batches(items, size=TICKET_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert_transitions(values):
+    # executemany instead of bulk_create: init_tickets logs up to a million rows at once
+    fields = [TicketTransition._meta.get_field(name) for name in TRANSITION_FIELDS]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(TicketTransition._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, values)
+
+
+def _adjust_counters(deltas):
+    # Always in (event, status) order, so two transitions touching the same
+    # counters in opposite directions cannot deadlock each other
+    changes = sorted((key, change) for key, change in deltas.items() if key[1] is not None and change)
+    for (event_id, status), change in changes:
+        counters = StatusCounter.objects.filter(event_id=event_id, status=status)
+        if not counters.update(count=F('count') + change):
+            # First ticket in this status; another transaction may create the row too
+            StatusCounter.objects.bulk_create(
+                [StatusCounter(event_id=event_id, status=status)], ignore_conflicts=True
+            )
+            counters.update(count=F('count') + change)
+
+
+def _record(rows, to_status, source, publish=True):
+    """
+    Log and count the tickets in `rows`, (event_id, number, from_status)
+    tuples, moving to `to_status`. Must run inside the transaction that
+    changed them.
+    """
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    values = []
+    deltas = Counter()
+    changes = defaultdict(dict)
+    for event_id, number, from_status in rows:
+        changes[event_id][number] = to_status
+        if from_status == to_status:
+            continue
+        values.append((event_id, number, from_status, to_status, source, created_at))
+        deltas[event_id, from_status] -= 1
+        deltas[event_id, to_status] += 1
+
+    if values:
+        _insert_transitions(values)
+        _adjust_counters(deltas)
+    if publish:
+        for event_id, numbers in changes.items():
+            tickets_changed(event_id, numbers)
+
+
+def _locked_rows(tickets):
+    # Locks the rows where the backend can. SQLite has no row locks: with
+    # SQLITE_TRANSACTION_MODE=IMMEDIATE the transaction already holds the write
+    # lock, otherwise the predicate kept on the UPDATE catches a stale read.
+    return list(
+        tickets.select_for_update().order_by('id').values_list('id', 'event_id', 'number', 'status')
+    )
+
+
+def transition_tickets(tickets, to_status, source, **fields):
+    """
+    Move every ticket in the `tickets` queryset to `to_status`, also setting
+    `fields`. Returns how many tickets were updated, like update().
+    """
+    with transaction.atomic():
+        rows = _locked_rows(tickets)
+        for batch in _batches(rows):
+            # Still filtered by `tickets`, so a row that changed since the read is left alone
+            updated = tickets.filter(id__in=[row[0] for row in batch]).update(status=to_status, **fields)
+            if updated != len(batch):
+                raise DatabaseError('Tickets changed between reading and updating them')
+        _record([row[1:] for row in rows], to_status, source)
+    return len(rows)
+
+
+def delete_tickets(tickets, source):
+    """Delete every ticket in the `tickets` queryset. Returns how many were deleted."""
+    with transaction.atomic():
+        rows = _locked_rows(tickets)
+        for batch in _batches(rows):
+            Ticket.objects.filter(id__in=[row[0] for row in batch]).delete()
+        _record([row[1:] for row in rows], None, source)
+    return len(rows)
+
+
+def save_ticket(ticket, source):
+    """
+    Save a ticket edited as a whole, e.g. in the admin. Moving it to another
+    event or number counts as deleting it there and creating it here.
+    """
+    with transaction.atomic():
+        old = None
+        if ticket.pk is not None:
+            old = _locked_rows(Ticket.objects.filter(pk=ticket.pk))
+            old = old[0][1:] if old else None
+        ticket.save()
+        if old is not None and old[:2] == (ticket.event_id, ticket.number):
+            _record([old], ticket.status, source)
+            return
+        if old is not None:
+            _record([old], None, source)
+        _record([(ticket.event_id, ticket.number, None)], ticket.status, source)
+
+
+def record_created(event_id, numbers, source, status='AVAILABLE'):
+    """
+    Log and count tickets that were just inserted. Nothing is published: a
+    caller creating many tickets sends one tickets_changed(event_id, None).
+    """
+    _record([(event_id, number, None) for number in numbers], status, source, publish=False)
+
+
+def status_counts(event):
+    """{status: count} for an event from its counters, in one small query."""
+    counts = dict(StatusCounter.objects.filter(event=event).values_list('status', 'count'))
+    return {status: counts.get(status, 0) for status, _ in Ticket.STATUS_CHOICES}
+
+
+def event_stats(event):
+    """
+    Sales totals for an event. LOCKED includes locks that have expired but
+    not been released by the reaper yet.
+    """
+    counts = status_counts(event)
+    return {
+        'available': counts['AVAILABLE'],
+        'locked': counts['LOCKED'],
+        'sold': counts['SOLD'],
+        'total': sum(counts.values()),
+        'revenue': counts['SOLD'] * event.price,
+    }
+
+
+def replayed_counts(event):
+    """{status: count} for an event by replaying its transition log."""
+    log = TicketTransition.objects.filter(event=event).order_by()
+    counts = Counter()
+    for row in log.values('to_status').annotate(n=Count('id')):
+        counts[row['to_status']] += row['n']
+    for row in log.values('from_status').annotate(n=Count('id')):
+        counts[row['from_status']] -= row['n']
+    return {status: counts[status] for status, _ in Ticket.STATUS_CHOICES}
+
+
+def table_counts(event):
+    """{status: count} for an event by counting its tickets."""
+    counts = dict(
+        Ticket.objects.filter(event=event).order_by().values_list('status').annotate(n=Count('id'))
+    )
+    return {status: counts.get(status, 0) for status, _ in Ticket.STATUS_CHOICES}
+
+
+def reconcile(event, source='reconcile'):
+    """
+    Bring an event's log and counters back in line with its tickets after a
+    change that bypassed this module: log correcting transitions for every
+    ticket whose replayed log does not end in its current status, then
+    overwrite the counters. Returns how many tickets were corrected.
+    """
+    with transaction.atomic():
+        # Replaying a ticket's log should leave +1 in its current status and 0 elsewhere
+        log = TicketTransition.objects.filter(event=event).order_by()
+        net = defaultdict(Counter)
+        for number, status, n in log.values_list('number', 'to_status').annotate(n=Count('id')):
+            net[number][status] += n
+        for number, status, n in log.values_list('number', 'from_status').annotate(n=Count('id')):
+            net[number][status] -= n
+        for number, status in Ticket.objects.filter(event=event).values_list('number', 'status'):
+            net[number][status] -= 1
+
+        fixes = defaultdict(list)
+        for number, counts in net.items():
+            extra = [status for status, n in counts.items() if status is not None for _ in range(n)]
+            missing = [status for status, n in counts.items() if status is not None for _ in range(-n)]
+            for from_status, to_status in zip_longest(extra, missing):
+                fixes[to_status].append((event.id, number, from_status))
+        for to_status, rows in fixes.items():
+            _record(rows, to_status, source)
+
+        for status, count in table_counts(event).items():
+            StatusCounter.objects.update_or_create(event=event, status=status, defaults={'count': count})
+    return len({row[1] for rows in fixes.values() for row in rows})
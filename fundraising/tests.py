@@ -1,3 +1,550 @@
-from django.test import TestCase
+import io
+import re
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from .availability import AvailabilitySnapshot, get_snapshot, get_version
+from .images import negotiate_format
+from .management.commands.init_tickets import insert_tickets
+from .message_buffer import MessageBuffer
+from .message_feed import decode_cursor, encode_cursor, get_feed_page
+from .models import Event, Reservation, Ticket, TicketTransition, UserMessage
+from .payments import build_vietqr_payload, crc16_ccitt
+from .reaper import release_expired_tickets
+from .services import (
+    delete_tickets, reconcile, record_created, replayed_counts, status_counts, table_counts,
+    transition_tickets,
+)
+from .views import CHECKOUT_REPLAY_KEY, _astream_ticket_zip, claim_tickets, sell_reservation
 
-# Create your tests here.
+# Every test gets a private cache instead of the configured, possibly shared, one
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_event(slug=None, count=10):
+    # The default event is created by a migration
+    event, _ = Event.objects.update_or_create(
+        slug=slug or settings.DEFAULT_EVENT_SLUG,
+        defaults={'name': 'Test', 'first_number': 1, 'last_number': count, 'price': 10000},
+    )
+    Ticket.objects.bulk_create(Ticket(event=event, number=n) for n in range(1, count + 1))
+    record_created(event.id, range(1, count + 1), 'test')
+    return event
+
+
+def reserve(event, numbers, locked_at=None):
+    locked_at = locked_at or timezone.now()
+    return Reservation(
+        event=event,
+        session_key='test',
+        ticket_numbers=numbers,
+        expires_at=locked_at + timedelta(seconds=event.lock_seconds),
+    )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClaimTicketsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event()
+        self.expired = timezone.now() - timedelta(seconds=self.event.lock_seconds + 60)
+
+    def test_claims_available_tickets(self):
+        reservation = reserve(self.event, [1, 2])
+        self.assertEqual(claim_tickets(reservation, timezone.now()), [])
+        self.assertEqual(sorted(reservation.tickets.values_list('number', flat=True)), [1, 2])
+        self.assertFalse(reservation.tickets.exclude(status='LOCKED').exists())
+
+    def test_partly_lost_claim_keeps_nothing(self):
+        holder = reserve(self.event, [2])
+        claim_tickets(holder, timezone.now())
+
+        reservation = reserve(self.event, [1, 2, 3])
+        self.assertEqual(claim_tickets(reservation, timezone.now()), [2])
+        self.assertFalse(Reservation.objects.filter(token=reservation.token).exists())
+        self.assertEqual(
+            list(Ticket.objects.filter(number__in=[1, 3]).values_list('status', flat=True)),
+            ['AVAILABLE', 'AVAILABLE'],
+        )
+        self.assertEqual(Ticket.objects.get(number=2).reservation, holder)
+
+    def test_expired_lock_is_taken_over(self):
+        stale = reserve(self.event, [1], self.expired)
+        claim_tickets(stale, self.expired)
+
+        reservation = reserve(self.event, [1])
+        self.assertEqual(claim_tickets(reservation, timezone.now()), [])
+        self.assertEqual(Ticket.objects.get(number=1).reservation, reservation)
+
+    def test_sell_fails_when_the_lock_was_retaken(self):
+        stale = reserve(self.event, [1, 2], self.expired)
+        claim_tickets(stale, self.expired)
+        reservation = reserve(self.event, [2])
+        claim_tickets(reservation, timezone.now())
+
+        self.assertFalse(sell_reservation(stale, 'A', '0912345678'))
+        # Nothing is sold, not even the ticket the stale reservation still holds
+        self.assertFalse(Ticket.objects.filter(status='SOLD').exists())
+        self.assertEqual(Ticket.objects.get(number=2).reservation, reservation)
+
+        self.assertTrue(sell_reservation(reservation, 'B', '0912345678'))
+        self.assertEqual(Ticket.objects.get(number=2).buyer_name, 'B')
+
+
+class PaymentPayloadTests(TestCase):
+    def test_crc16_check_value(self):
+        # The standard check value of CRC-16/CCITT-FALSE
+        self.assertEqual(crc16_ccitt(b'123456789'), 0x29B1)
+
+    def test_vietqr_payload(self):
+        payload = build_vietqr_payload('970407', '6816617815', 50000, 'Vé số Đồng')
+        self.assertEqual(
+            payload,
+            '000201'
+            '010212'
+            '3854'
+            '0010A000000727'
+            '01240006970407011068166178150208QRIBFTTA'
+            '5303704'
+            '540550000'
+            '5802VN'
+            '62140810Ve so Dong'
+            '6304FA9C',
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MessageFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        for i in range(5):
+            UserMessage.objects.create(name='A', phone='1', message=f'm{i}')
+        UserMessage.objects.create(name='A', phone='1', message='hidden', is_public=False)
+        # Two pairs share a timestamp, so the cursor has to break ties on id
+        for i, message in enumerate(UserMessage.objects.order_by('id')):
+            UserMessage.objects.filter(pk=message.pk).update(created_at=now - timedelta(seconds=i // 2))
+
+    def test_cursor_round_trip(self):
+        message = UserMessage.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(message)), (message.created_at, message.pk))
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor')
+
+    def test_pages_cover_every_public_message_once(self):
+        seen = []
+        page = get_feed_page(limit=2)
+        while True:
+            seen += [m['message'] for m in page['messages']]
+            if page['next'] is None:
+                break
+            page = get_feed_page(page['next'], limit=2)
+        expected = list(
+            UserMessage.objects.filter(is_public=True).order_by('-created_at', '-id').values_list('message', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+
+@override_settings(CACHES=TEST_CACHES, MESSAGE_BUFFER=True)
+@mock.patch.object(MessageBuffer, '_ensure_started')
+class MessageBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def drain(self, buffer):
+        sizes = []
+        while batch := buffer._next_batch():
+            sizes.append(len(batch))
+            self.assertEqual(buffer._write(batch), [])
+        return sizes
+
+    def test_messages_are_inserted_in_batches(self, ensure_started):
+        buffer = MessageBuffer(max_size=10, batch_size=3, flush_interval=0.01)
+        for i in range(7):
+            self.assertTrue(buffer.put('A', '1', f'm{i}'))
+        self.assertEqual(self.drain(buffer), [3, 3, 1])
+        self.assertEqual(UserMessage.objects.count(), 7)
+
+    def test_full_buffer_answers_429(self, ensure_started):
+        with mock.patch('fundraising.views.message_buffer', MessageBuffer(1, 10, 0.01)):
+            self.assertEqual(self.client.post('/submit-message/', {'message': 'a'}).status_code, 200)
+            response = self.client.post('/submit-message/', {'message': 'b'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_too_long_phone_is_refused_before_the_buffer(self, ensure_started):
+        response = self.client.post('/submit-message/', {'message': 'a', 'phone': '1' * 21})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejected_row_is_dropped_and_the_rest_inserted(self, ensure_started):
+        buffer = MessageBuffer(max_size=10, batch_size=10, flush_interval=0.01)
+        buffer.put('A', '1', 'first')
+        buffer.put('A', '1', None)  # NOT NULL violation
+        buffer.put('A', '1', 'last')
+        with self.assertLogs('fundraising.message_buffer', 'WARNING'):
+            self.assertEqual(self.drain(buffer), [3])
+        self.assertEqual(sorted(UserMessage.objects.values_list('message', flat=True)), ['first', 'last'])
+
+    def test_batch_is_kept_while_the_database_is_unavailable(self, ensure_started):
+        buffer = MessageBuffer(max_size=10, batch_size=10, flush_interval=0.01)
+        buffer.put('A', '1', 'm')
+        batch = buffer._next_batch()
+        with mock.patch.object(buffer, 'flush', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('fundraising.message_buffer', 'ERROR'):
+            self.assertEqual(buffer._write(batch), batch)
+        self.assertEqual(buffer._write(batch), [])
+
+
+class MessageFlusherThreadTests(SimpleTestCase):
+    def test_dead_flusher_thread_is_restarted(self):
+        buffer = MessageBuffer(max_size=10, batch_size=10, flush_interval=0.01)
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        buffer._thread = dead
+        with mock.patch('fundraising.message_buffer.threading.Thread') as thread, \
+                self.assertLogs('fundraising.message_buffer', 'ERROR'):
+            buffer._ensure_started()
+        thread.return_value.start.assert_called_once_with()
+        self.assertIs(buffer._thread, thread.return_value)
+
+
+@override_settings(CACHES=TEST_CACHES)
+@mock.patch('fundraising.views.aget_payment_qr', mock.AsyncMock(return_value='data:image/png;base64,'))
+class CheckoutReplayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event()
+
+    def start_checkout(self, numbers):
+        self.client.post('/lock/', {'ticket_numbers': numbers})
+        page = self.client.get('/checkout/').content.decode()
+        key = re.search(r'name="idempotency_key" value="([^"]+)"', page).group(1)
+        return {'name': 'A', 'phone': '0912345678', 'idempotency_key': key}
+
+    def test_repeated_submission_is_replayed(self):
+        form = self.start_checkout(['1', '2'])
+        first = self.client.post('/checkout/', form)
+        second = self.client.post('/checkout/', form)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.context['tickets'], first.context['tickets'])
+        self.assertEqual(TicketTransition.objects.filter(source='checkout').count(), 2)
+
+    @mock.patch('fundraising.views.CHECKOUT_REPLAY_WAIT', 0.2)
+    def test_retry_that_gives_up_waiting_leaves_the_first_submission_alone(self):
+        form = self.start_checkout(['1'])
+        key = CHECKOUT_REPLAY_KEY.format(self.client.session.session_key, form['idempotency_key'])
+        # The first submission is still running, and has already sold the ticket
+        cache.set(key, 'pending:first', 60)
+        reservation = Reservation.objects.get()
+        sell_reservation(reservation, 'A', '0912345678')
+
+        response = self.client.post('/checkout/', form)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(cache.get(key), 'pending:first')
+
+        # Once the first submission finishes, a retry gets its page
+        context = {'event': self.event, 'tickets': list(reservation.tickets.all()), 'qr_url': '', 'amount': 10000}
+        cache.set(key, context, 60)
+        response = self.client.post('/checkout/', form)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['tickets'], context['tickets'])
+
+    def test_no_replay_after_cancel_transaction(self):
+        form = self.start_checkout(['1'])
+        self.client.post('/checkout/', form)
+        self.client.post('/cancel-transaction/')
+        self.assertEqual(Ticket.objects.get(number=1).status, 'AVAILABLE')
+
+        response = self.client.post('/checkout/', form)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Ticket.objects.get(number=1).status, 'AVAILABLE')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TransitionLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event()
+
+    def assertCountsMatch(self):
+        actual = table_counts(self.event)
+        self.assertEqual(status_counts(self.event), actual)
+        self.assertEqual(replayed_counts(self.event), actual)
+
+    def test_counters_and_log_follow_every_transition(self):
+        self.assertCountsMatch()
+
+        expired = timezone.now() - timedelta(seconds=self.event.lock_seconds + 60)
+        claim_tickets(reserve(self.event, [1, 2], expired), expired)
+        self.assertCountsMatch()
+
+        reservation = reserve(self.event, [3, 4])
+        claim_tickets(reservation, timezone.now())
+        self.assertCountsMatch()
+
+        sell_reservation(reservation, 'A', '0912345678')
+        self.assertCountsMatch()
+
+        self.assertEqual(release_expired_tickets(), 2)
+        self.assertCountsMatch()
+
+        transition_tickets(Ticket.objects.filter(number=3), 'AVAILABLE', 'test')
+        self.assertCountsMatch()
+
+        delete_tickets(Ticket.objects.filter(number__in=[4, 5]), 'test')
+        self.assertCountsMatch()
+        self.assertEqual(status_counts(self.event), {'AVAILABLE': 8, 'LOCKED': 0, 'SOLD': 0})
+
+    def test_reconcile_repairs_changes_that_bypassed_the_log(self):
+        Ticket.objects.filter(number=1).update(status='SOLD')
+        Ticket.objects.filter(number=2).delete()
+        self.assertNotEqual(status_counts(self.event), table_counts(self.event))
+
+        self.assertEqual(reconcile(self.event), 2)
+        self.assertCountsMatch()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AvailabilitySnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event()
+
+    def test_change_is_patched_into_the_next_version(self):
+        first = get_snapshot(self.event)
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_tickets(Ticket.objects.filter(number=3), 'SOLD', 'test')
+        self.assertEqual(get_version(self.event.id), first.version + 1)
+
+        with mock.patch.object(AvailabilitySnapshot, 'build', wraps=AvailabilitySnapshot.build) as build:
+            snapshot = get_snapshot(self.event)
+        build.assert_not_called()
+        self.assertEqual(snapshot.version, first.version + 1)
+        self.assertEqual(snapshot.status_of(3), 'SOLD')
+        self.assertEqual(snapshot.status_of(4), 'AVAILABLE')
+
+    def test_missing_delta_falls_back_to_a_full_build(self):
+        first = get_snapshot(self.event)
+        with self.captureOnCommitCallbacks(execute=False):
+            # The delta is never published, as if the process died after the commit
+            transition_tickets(Ticket.objects.filter(number=3), 'SOLD', 'test')
+        snapshot = get_snapshot(self.event)
+        self.assertEqual(snapshot.version, first.version + 1)
+        self.assertEqual(snapshot.status_of(3), 'SOLD')
+
+    def test_rolled_back_change_keeps_the_version(self):
+        version = get_snapshot(self.event).version
+        with transaction.atomic():
+            transition_tickets(Ticket.objects.filter(number=3), 'SOLD', 'test')
+            transaction.set_rollback(True)
+        self.assertEqual(get_version(self.event.id), version)
+
+    def test_expired_lock_bumps_the_version(self):
+        # A lock that runs out shortly after the snapshot is built
+        almost_expired = timezone.now() - timedelta(seconds=self.event.lock_seconds) + timedelta(seconds=0.2)
+        claim_tickets(reserve(self.event, [5], almost_expired), almost_expired)
+        locked = get_snapshot(self.event)
+        self.assertEqual(locked.status_of(5), 'LOCKED')
+
+        time.sleep(0.3)
+        snapshot = get_snapshot(self.event)
+        self.assertEqual(snapshot.version, locked.version + 1)
+        self.assertEqual(snapshot.status_of(5), 'AVAILABLE')
+
+    def test_snapshot_is_indexed_from_the_first_number(self):
+        event = Event.objects.create(slug='big', name='Big', first_number=2000001, last_number=2000500)
+        Ticket.objects.bulk_create(Ticket(event=event, number=n) for n in event.ticket_range())
+        record_created(event.id, event.ticket_range(), 'test')
+        transition_tickets(Ticket.objects.filter(event=event, number=2000001), 'SOLD', 'test')
+
+        data = self.client.get('/api/event/big/tickets/status').json()
+        self.assertEqual(data['first'], 2000001)
+        self.assertEqual(len(data['statuses']), 500)
+        self.assertEqual(data['statuses'][:2], 'SA')
+
+        snapshot = get_snapshot(event)
+        self.assertEqual(snapshot.status_of(2000500), 'AVAILABLE')
+        self.assertIsNone(snapshot.status_of(1))
+        self.assertEqual(snapshot.tickets(0, 2), [(2000002, 'AVAILABLE'), (2000003, 'AVAILABLE')])
+
+        # A ticket added below the range grows the snapshot at the front
+        patched = snapshot.patched(snapshot.version + 1, [(time.time(), {2000000: 'S'})], event.lock_seconds)
+        self.assertEqual(patched.first, 2000000)
+        self.assertEqual(patched.status_of(2000000), 'SOLD')
+        self.assertEqual(patched.status_of(2000001), 'SOLD')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class InitTicketsTests(TestCase):
+    def init_tickets(self, *args):
+        out = StringIO()
+        with mock.patch('fundraising.management.commands.init_tickets.insert_tickets',
+                        wraps=insert_tickets) as insert:
+            call_command('init_tickets', '--event', 'init', '--batch-size', '3', *args, stdout=out)
+        return insert.call_count, out.getvalue()
+
+    def test_creates_only_missing_tickets_in_batches(self):
+        batches, out = self.init_tickets('--count', '7')
+        event = Event.objects.get(slug='init')
+        self.assertEqual(batches, 3)
+        self.assertIn('created 7 tickets', out)
+        self.assertEqual(sorted(Ticket.objects.filter(event=event).values_list('number', flat=True)),
+                         list(range(1, 8)))
+        self.assertEqual(status_counts(event), table_counts(event))
+
+        delete_tickets(Ticket.objects.filter(event=event, number=4), 'test')
+        batches, out = self.init_tickets('--count', '9')
+        self.assertEqual(batches, 1)
+        self.assertIn('created 3 tickets', out)
+        self.assertEqual(Ticket.objects.filter(event=event).count(), 9)
+        self.assertEqual(replayed_counts(event), table_counts(event))
+
+        batches, out = self.init_tickets()
+        self.assertEqual(batches, 0)
+        self.assertIn('already exist', out)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TicketStatusApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event()
+
+    def test_since_sends_only_the_changes(self):
+        full = self.client.get('/api/tickets/status').json()
+        self.assertEqual(full['statuses'], 'A' * 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_tickets(Ticket.objects.filter(number=3), 'SOLD', 'test')
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_tickets(reserve(self.event, [4, 5]), timezone.now())
+
+        data = self.client.get('/api/tickets/status', {'since': full['version']}).json()
+        self.assertEqual(data['version'], full['version'] + 2)
+        self.assertEqual(data['since'], full['version'])
+        self.assertEqual(data['changes'], {'3': 'S', '4': 'L', '5': 'L'})
+        self.assertNotIn('statuses', data)
+
+    def test_unknown_since_sends_everything(self):
+        version = get_version(self.event.id)
+        for since in ('nonsense', str(version - 100)):
+            data = self.client.get('/api/tickets/status', {'since': since}).json()
+            self.assertEqual(data['statuses'], 'A' * 10)
+
+    def test_unchanged_statuses_are_not_modified(self):
+        response = self.client.get('/api/tickets/status')
+        etag = response['ETag']
+        response = self.client.get('/api/tickets/status', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_tickets(Ticket.objects.filter(number=3), 'SOLD', 'test')
+        response = self.client.get('/api/tickets/status', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TicketDownloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = create_event()
+        reservation = reserve(self.event, [3])
+        claim_tickets(reservation, timezone.now())
+        sell_reservation(reservation, 'A', '0912345678')
+
+    @mock.patch('fundraising.views.get_ticket_image_bytes', return_value=b'image')
+    def test_unsold_ticket_is_not_served(self, render):
+        ticket = Ticket.objects.get(number=4)
+        response = self.client.get(f'/download-ticket/{ticket.id}/')
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        render.assert_not_called()
+
+    @mock.patch('fundraising.views.get_ticket_image_bytes', return_value=b'image')
+    def test_current_copy_is_not_modified(self, render):
+        ticket = Ticket.objects.get(number=3)
+        response = self.client.get(f'/download-ticket/{ticket.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'image')
+        render.reset_mock()
+
+        response = self.client.get(f'/download-ticket/{ticket.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+        # The SOLD check still comes before the validators
+        Ticket.objects.filter(id=ticket.id).update(status='AVAILABLE')
+        response = self.client.get(f'/download-ticket/{ticket.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 302)
+
+
+@mock.patch('fundraising.images.SUPPORTED_FORMATS', {'jpeg', 'webp', 'avif'})
+class NegotiateFormatTests(SimpleTestCase):
+    def test_smallest_explicitly_accepted_format_wins(self):
+        self.assertEqual(negotiate_format('image/avif,image/webp,image/apng,*/*;q=0.8'), 'avif')
+        self.assertEqual(negotiate_format('image/webp,*/*'), 'webp')
+        self.assertEqual(negotiate_format('IMAGE/WEBP ; q=0.5'), 'webp')
+
+    def test_wildcards_and_refusals_fall_back_to_jpeg(self):
+        self.assertEqual(negotiate_format(''), 'jpeg')
+        self.assertEqual(negotiate_format('*/*'), 'jpeg')
+        self.assertEqual(negotiate_format('image/*'), 'jpeg')
+        self.assertEqual(negotiate_format('image/avif;q=0,image/webp;q=x'), 'jpeg')
+
+    def test_formats_the_encoder_lacks_are_skipped(self):
+        with mock.patch('fundraising.images.SUPPORTED_FORMATS', {'jpeg', 'webp'}):
+            self.assertEqual(negotiate_format('image/avif,image/webp'), 'webp')
+
+
+def fake_ticket_image(number, variant='full', image_format='jpeg'):
+    return f'ticket {number}'.encode() * 100
+
+
+@override_settings(CACHES=TEST_CACHES)
+@mock.patch('fundraising.views.get_ticket_image_bytes', fake_ticket_image)
+class DownloadAllTicketsTests(TestCase):
+    def assertValidZip(self, data, numbers):
+        with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.namelist(), [f've_so_{number}.jpg' for number in numbers])
+            for info in zip_file.infolist():
+                self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zip_file.read('ve_so_3.jpg'), fake_ticket_image(3))
+
+    def test_streams_a_valid_zip_of_sold_tickets(self):
+        event = create_event()
+        session = self.client.session
+        session.save()
+        reservation = reserve(event, [5, 3, 4])
+        reservation.session_key = session.session_key
+        claim_tickets(reservation, timezone.now())
+        sell_reservation(reservation, 'A', '0912345678')
+        session['last_sold_reservation'] = str(reservation.token)
+        session.save()
+
+        response = self.client.get('/download-all-tickets/')
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertValidZip(b''.join(response.streaming_content), [3, 4, 5])
+
+    def test_async_stream_writes_the_same_zip(self):
+        async def collect():
+            return b''.join([chunk async for chunk in _astream_ticket_zip([3, 4, 5])])
+
+        self.assertValidZip(async_to_sync(collect)(), [3, 4, 5])
+
+    def test_nothing_to_download_redirects(self):
+        response = self.client.get('/download-all-tickets/')
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
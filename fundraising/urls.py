@@ -4,6 +4,12 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('lock/', views.lock_tickets, name='lock_tickets'),
+    # The unprefixed paths above and below serve the default event
+    path('event/<slug:event_slug>/', views.index, name='index'),
+    path('event/<slug:event_slug>/lock/', views.lock_tickets, name='lock_tickets'),
+    path('event/<slug:event_slug>/events/', views.ticket_events, name='ticket_events'),
+    path('api/event/<slug:event_slug>/tickets/status', views.ticket_status, name='ticket_status'),
+    path('api/event/<slug:event_slug>/tickets/stats', views.ticket_stats, name='ticket_stats'),
     path('checkout/', views.checkout, name='checkout'),
     path('cancel-checkout/', views.cancel_checkout, name='cancel_checkout'),
     path('cancel-transaction/', views.cancel_transaction, name='cancel_transaction'),
@@ -11,4 +17,9 @@ urlpatterns = [
     path('download-all-tickets/', views.download_all_tickets, name='download_all_tickets'),
     path('ticket-image/<int:ticket_id>/', views.serve_ticket_image, name='serve_ticket_image'),
     path('submit-message/', views.submit_message, name='submit_message'),
+    path('events/tickets/', views.ticket_events, name='ticket_events'),
+    path('api/tickets/status', views.ticket_status, name='ticket_status'),
+    path('api/tickets/stats', views.ticket_stats, name='ticket_stats'),
+    path('api/messages', views.message_feed, name='message_feed'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
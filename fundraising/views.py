@@ -1,113 +1,299 @@
-import requests
-import io
+import asyncio
+import json
+import secrets
+import time
 import zipfile
-import os
+from collections import deque
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-from django.shortcuts import render, redirect, get_object_or_404
-from django.db import transaction
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.db import connection, transaction
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.http import JsonResponse, HttpResponse
-from PIL import Image, ImageDraw, ImageFont
-from .models import Ticket, UserMessage
-
-def release_expired_tickets():
-    cleanup_threshold = timezone.now() - timedelta(minutes=3)
-    expired = Ticket.objects.filter(status='LOCKED', locked_at__lt=cleanup_threshold)
-    count = expired.count()
-    if count > 0:
-        expired.update(status='AVAILABLE', locked_at=None)
-    return count
-
-def index(request):
-    release_expired_tickets()
-    tickets_list = Ticket.objects.all().order_by('status', 'number')
-    paginator = Paginator(tickets_list, 100)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from . import metrics
+from .availability import changes_since, get_snapshot
+from .broadcast import ticket_broadcaster
+from .events import get_event
+from .images import (
+    IMAGE_FORMATS, IMAGE_VARIANTS, get_ticket_image_bytes, negotiate_format, render_pool,
+    run_in_render_pool, ticket_assets_current, ticket_image_validators,
+)
+from .message_buffer import message_buffer
+from .message_feed import FEED_PAGE_SIZE, forget_first_page, get_feed_page
+from .message_pool import add_to_pool, random_public_message
+from .payments import aget_payment_qr
+from .services import event_stats, transition_tickets
+from .models import Reservation, Ticket, UserMessage
+
+SSE_RETRY_MS = 3000
+SSE_KEEPALIVE_SECONDS = 15
+
+TICKETS_PER_PAGE = 100
+GRID_CACHE_KEY = 'ticket_grid:{}:{}:{}'
+GRID_CACHE_TIMEOUT = 60 * 10
+
+# The image for a ticket only changes with the template or font; the ETag covers that
+TICKET_IMAGE_CACHE_CONTROL = 'public, max-age=86400'
+# Revalidated every time so the SOLD check still runs
+TICKET_DOWNLOAD_CACHE_CONTROL = 'private, no-cache'
+
+# Result of a checkout submission, by session and the form's idempotency key
+CHECKOUT_REPLAY_KEY = 'checkout_replay:{}:{}'
+CHECKOUT_REPLAY_TIMEOUT = 60 * 15
+# Held while the first submission with a key is still running
+CHECKOUT_PENDING = 'pending'
+CHECKOUT_PENDING_TIMEOUT = 60
+# How long a repeat submission waits for the first one to finish
+CHECKOUT_REPLAY_WAIT = 10
+CHECKOUT_REPLAY_POLL = 0.1
+
+def claim_tickets(reservation, locked_at):
+    """
+    Create the reservation and lock its tickets with a conditional UPDATE.
+    Returns the numbers that could not be claimed; if any were lost, nothing is kept.
+    """
+    wanted = set(reservation.ticket_numbers)
+    event = reservation.event
+    with transaction.atomic():
+        candidates = Ticket.objects.filter(event=event).claimable(event.lock_seconds).filter(
+            number__in=wanted
+        )
+
+        if connection.features.has_select_for_update_skip_locked:
+            # Rows another buyer is claiming right now count as lost instead of blocking us
+            free = set(
+                candidates.select_for_update(skip_locked=True).values_list('number', flat=True)
+            )
+            if free != wanted:
+                return sorted(wanted - free)
+
+        reservation.save()
+        claimed = transition_tickets(
+            candidates, 'LOCKED', 'lock', locked_at=locked_at, reservation=reservation
+        )
+        if claimed == len(wanted):
+            return []
+
+        # Someone got in first: see which rows we did win, then undo the partial claim
+        won = set(reservation.tickets.values_list('number', flat=True))
+        transaction.set_rollback(True)
+        return sorted(wanted - won)
+
+def get_session_reservation(request, session_field='reservation'):
+    """
+    Return the reservation whose token is stored in the session, if it belongs to this session.
+    """
+    token = request.session.get(session_field)
+    if not token:
+        return None
+    return Reservation.objects.select_related('event').filter(
+        token=token, session_key=request.session.session_key
+    ).first()
+
+async def aget_session_reservation(request, session_field='reservation'):
+    """get_session_reservation for async views."""
+    token = await request.session.aget(session_field)
+    if not token:
+        return None
+    return await Reservation.objects.select_related('event').filter(
+        token=token, session_key=request.session.session_key
+    ).afirst()
+
+def redirect_to_event(event):
+    """Back to the event's ticket grid; the default event lives at /."""
+    if event.slug == settings.DEFAULT_EVENT_SLUG:
+        return redirect('index')
+    return redirect('index', event_slug=event.slug)
+
+def render_ticket_grid(event, snapshot, page_number):
+    """
+    Return the (grid, pagination) HTML for one page of the snapshot. They are the
+    same for every visitor, so each is rendered once per (page, version); any
+    ticket change bumps the version and so retires the cached copies.
+    """
+    # Validating the page number only needs the ticket count
+    page = Paginator(range(snapshot.ticket_count()), TICKETS_PER_PAGE).get_page(page_number)
+    key = GRID_CACHE_KEY.format(event.id, snapshot.version, page.number)
+    fragments = cache.get(key)
+    if fragments is None:
+        tickets = snapshot.tickets(page.start_index() - 1, page.end_index())
+        page_range = page.paginator.get_elided_page_range(page.number)
+        fragments = (
+            render_to_string('fundraising/_ticket_grid.html', {'tickets': tickets}),
+            render_to_string('fundraising/_pagination.html', {'page_obj': page, 'page_range': page_range}),
+        )
+        cache.set(key, fragments, GRID_CACHE_TIMEOUT)
+    return mark_safe(fragments[0]), mark_safe(fragments[1])
+
+def index(request, event_slug=None):
+    event = get_event(event_slug)
+    # Rendered from the cached availability snapshot, not from the Ticket table
+    snapshot = get_snapshot(event)
+    ticket_grid, pagination = render_ticket_grid(event, snapshot, request.GET.get('page'))
     
     # Get random user message
-    latest_message = UserMessage.objects.order_by('?').first()
+    latest_message = random_public_message()
     
     return render(request, 'fundraising/index.html', {
-        'page_obj': page_obj,
+        'event': event,
+        'ticket_grid': ticket_grid,
+        'pagination': pagination,
+        'availability_version': snapshot.version,
         'latest_message': latest_message
     })
 
-def lock_tickets(request):
+def lock_tickets(request, event_slug=None):
+    event = get_event(event_slug)
     if request.method == 'POST':
         ticket_numbers = request.POST.getlist('ticket_numbers')
         if not ticket_numbers:
             messages.error(request, 'Please select at least one ticket.')
-            return redirect('index')
+            return redirect_to_event(event)
         
         # Convert to integers
         try:
-            ticket_numbers = [int(n) for n in ticket_numbers]
+            ticket_numbers = sorted({int(n) for n in ticket_numbers})
         except ValueError:
              messages.error(request, 'Invalid ticket numbers.')
-             return redirect('index')
+             return redirect_to_event(event)
 
-        with transaction.atomic():
-            # Check availability
-            tickets = Ticket.objects.filter(number__in=ticket_numbers)
-            if tickets.count() != len(ticket_numbers):
+        # The session needs a key before the reservation can be tied to it
+        if request.session.session_key is None:
+            request.session.save()
+
+        locked_at = timezone.now()
+        reservation = Reservation(
+            event=event,
+            session_key=request.session.session_key,
+            ticket_numbers=ticket_numbers,
+            expires_at=locked_at + timedelta(seconds=event.lock_seconds),
+        )
+        lost = claim_tickets(reservation, locked_at)
+        if lost:
+            if Ticket.objects.filter(event=event, number__in=lost).count() != len(lost):
                 messages.error(request, 'Some tickets not found.')
-                return redirect('index')
-            
-            unavailable = tickets.exclude(status='AVAILABLE')
-            if unavailable.exists():
-                msg = ", ".join([str(t.number) for t in unavailable])
+            else:
+                msg = ", ".join(str(n) for n in lost)
                 messages.error(request, f'Tickets {msg} are no longer available.')
-                return redirect('index')
-            
-            # Lock them
-            tickets.update(status='LOCKED', locked_at=timezone.now())
-            
-            # Store in session
-            request.session['locked_tickets'] = ticket_numbers
-            return redirect('checkout')
+            return redirect_to_event(event)
+        
+        # Store in session
+        request.session['reservation'] = str(reservation.token)
+        return redirect('checkout')
     
-    return redirect('index')
+    return redirect_to_event(event)
+
+def sell_reservation(reservation, name, phone):
+    """
+    Mark the reservation's tickets SOLD to the buyer. Returns False, changing
+    nothing, if the reservation no longer holds all of them.
+    """
+    # Sell only rows still locked by this reservation; an expired lock
+    # that was taken by someone else no longer points here
+    with transaction.atomic():
+        sold = transition_tickets(
+            Ticket.objects.filter(reservation=reservation, status='LOCKED'), 'SOLD', 'checkout',
+            buyer_name=name,
+            buyer_phone=phone
+        )
+        if sold != len(reservation.ticket_numbers):
+            transaction.set_rollback(True)
+            return False
+    return True
+
+async def claim_checkout(replay_key):
+    """
+    Mark a checkout submission as in progress. Returns (claim, context):
+    `claim` is the marker this request stored when it owns the key, and so
+    must record the outcome there, else None; `context` is the success
+    context of an earlier submission with the same key, waited for while it
+    is still running.
+    """
+    claim = f'{CHECKOUT_PENDING}:{secrets.token_urlsafe(8)}'
+    deadline = time.monotonic() + CHECKOUT_REPLAY_WAIT
+    while True:
+        # add() is not atomic on every backend, so read the marker back before trusting it
+        if await cache.aadd(replay_key, claim, CHECKOUT_PENDING_TIMEOUT) and await cache.aget(replay_key) == claim:
+            return claim, None
+        context = await cache.aget(replay_key)
+        if isinstance(context, dict):
+            return None, context
+        if time.monotonic() >= deadline:
+            # Checking out again cannot sell twice; it fails on the SOLD rows
+            return None, None
+        await asyncio.sleep(CHECKOUT_REPLAY_POLL)
 
-def checkout(request):
-    locked_ids = request.session.get('locked_tickets', [])
-    if not locked_ids:
+async def checkout(request):
+    """
+    Async so that waiting on the database and the payment QR does not hold a
+    worker thread; the sale itself runs as one transaction in a thread.
+    A repeated submission of the same form (double tap, browser retry) gets
+    the first one's success page replayed from the cache.
+    """
+    replay_key, claim = None, None
+    idempotency_key = request.POST.get('idempotency_key') if request.method == 'POST' else None
+    if idempotency_key and request.session.session_key:
+        replay_key = CHECKOUT_REPLAY_KEY.format(request.session.session_key, idempotency_key)
+        claim, context = await claim_checkout(replay_key)
+        if context is not None:
+            return render(request, 'fundraising/success.html', context)
+
+    response, success_context = None, None
+    try:
+        response, success_context = await process_checkout(request)
+    finally:
+        # Only the submission that owns the key records its outcome; one that
+        # gave up waiting must not wipe the first one's pending or finished entry
+        if claim is not None:
+            if success_context is not None:
+                await cache.aset(replay_key, success_context, CHECKOUT_REPLAY_TIMEOUT)
+                await request.session.aset('last_checkout_replay', replay_key)
+            elif await cache.aget(replay_key) == claim:
+                # Let a retry of a failed submission run again
+                await cache.adelete(replay_key)
+    return response
+
+def checkout_form_context(event, ticket_numbers, total_amount, expiration_timestamp):
+    return {
+        'event': event,
+        'ticket_numbers': ticket_numbers,
+        'total_amount': total_amount,
+        'expiration_timestamp': expiration_timestamp,
+        # Sent back with the form so a repeated submission can be recognised
+        'idempotency_key': secrets.token_urlsafe(16),
+    }
+
+async def process_checkout(request):
+    """
+    The checkout itself. Returns (response, success page context); the
+    context is None unless the tickets were sold.
+    """
+    # One indexed lookup checks that the reservation exists and is ours
+    reservation = await aget_session_reservation(request)
+    if reservation is None:
         messages.error(request, 'No tickets selected.')
-        return redirect('index')
+        return redirect('index'), None
     
-    tickets = Ticket.objects.filter(number__in=locked_ids)
+    if reservation.is_expired():
+        # The reaper releases the rows; someone else may already hold them
+        await request.session.apop('reservation')
+        messages.error(request, 'Ticket reservation expired.')
+        return redirect_to_event(reservation.event), None
     
-    # Check if any ticket is missing
-    if tickets.count() != len(locked_ids):
-         messages.error(request, 'Ticket information incorrect.')
-         return redirect('index')
-
-    # Verify all tickets are still LOCKED (and thus belong to this session mostly)
-    # If a ticket is SOLD or AVAILABLE, it means it expired or was taken.
-    if tickets.exclude(status='LOCKED').exists():
-         messages.error(request, 'Reservation expired or tickets sold.')
-         return redirect('index')
-
-    # Get the earliest lock time to determine expiration
-    first_ticket = tickets.first()
-    expiration_timestamp = 0
-    if first_ticket and first_ticket.locked_at:
-        expire_at = first_ticket.locked_at + timedelta(minutes=3)
-        remaining = (expire_at - timezone.now()).total_seconds()
-        
-        # Double check expiration logic here as well
-        if remaining <= 0:
-             release_expired_tickets() # Ensure DB is updated
-             messages.error(request, 'Ticket reservation expired.')
-             return redirect('index')
-        
-        expiration_timestamp = expire_at.timestamp()
+    ticket_numbers = reservation.ticket_numbers
+    expiration_timestamp = reservation.expires_at.timestamp()
     
     # Calculate total
-    total_amount = tickets.count() * 10000
+    total_amount = len(ticket_numbers) * reservation.event.price
     
     if request.method == 'POST':
         # Process Payment confirmation
@@ -116,130 +302,64 @@ def checkout(request):
         
         if not name or not phone:
              messages.error(request, 'Please fill in all fields.')
-             return render(request, 'fundraising/checkout.html', {'tickets': tickets, 'total_amount': total_amount})
+             return render(request, 'fundraising/checkout.html', checkout_form_context(
+                 reservation.event, ticket_numbers, total_amount, expiration_timestamp
+             )), None
 
-        # Update tickets
-        with transaction.atomic():
-            tickets.update(
-                status='SOLD',
-                buyer_name=name,
-                buyer_phone=phone
-            )
-            # Store sold tickets in session for cancellation possibility
-            request.session['last_sold_tickets'] = locked_ids
-            # Clear locked session
-            del request.session['locked_tickets']
-            
-            # Call VietQR API
-            qr_url = None
-            try:
-                api_url = "https://api.vietqr.io/v2/generate"
-                payload = {
-                    "accountNo": 6816617815,
-                    "accountName": "HUYNH BAO TRONG",
-                    "acqId": 970407,
-                    "amount": total_amount,
-                    "addInfo": f"Thanh Toan Tien Ve So {name}",
-                    "format": "text",
-                    "template": "compact2"
-                }
-                
-                headers = {
-                    "x-client-id": settings.VIETQR_CLIENT_ID,
-                    "x-api-key": settings.VIETQR_API_KEY,
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.post(api_url, json=payload, headers=headers)
-                data = response.json()
-                
-                if data.get("code") == "00":
-                    qr_url = data.get("data", {}).get("qrDataURL")
-            except Exception as e:
-                print(f"Error generating QR: {e}")
-
-            return render(request, 'fundraising/success.html', {'tickets': tickets, 'qr_url': qr_url, 'amount': total_amount})
-
-    return render(request, 'fundraising/checkout.html', {
-        'tickets': tickets, 
-        'total_amount': total_amount,
-        'expiration_timestamp': expiration_timestamp
-    })
+        if not await sync_to_async(sell_reservation)(reservation, name, phone):
+            messages.error(request, 'Reservation expired or tickets sold.')
+            return redirect_to_event(reservation.event), None
+
+        # Keep the reservation in session for cancellation possibility
+        await request.session.aset('last_sold_reservation', await request.session.apop('reservation'))
+
+        # Built after the commit so no transaction waits on QR generation
+        qr_url = await aget_payment_qr(total_amount, f"Thanh Toan Tien Ve So {name}")
+
+        # Fetched here: templates cannot run queries in an async view
+        tickets = [ticket async for ticket in reservation.tickets.order_by('number')]
+        context = {'event': reservation.event, 'tickets': tickets, 'qr_url': qr_url, 'amount': total_amount}
+        return render(request, 'fundraising/success.html', context), context
+
+    return render(request, 'fundraising/checkout.html', checkout_form_context(
+        reservation.event, ticket_numbers, total_amount, expiration_timestamp
+    )), None
 
 def cancel_checkout(request):
     """Called when user clicks Back on checkout page"""
-    locked_ids = request.session.get('locked_tickets', [])
-    if locked_ids:
-        Ticket.objects.filter(number__in=locked_ids, status='LOCKED').update(status='AVAILABLE', locked_at=None)
-        del request.session['locked_tickets']
+    reservation = get_session_reservation(request)
+    if reservation is not None:
+        with transaction.atomic():
+            transition_tickets(
+                reservation.tickets.filter(status='LOCKED'), 'AVAILABLE', 'cancel_checkout',
+                locked_at=None, reservation=None
+            )
+            reservation.delete()
+        request.session.pop('reservation', None)
+        return redirect_to_event(reservation.event)
+    request.session.pop('reservation', None)
     return redirect('index')
 
 def cancel_transaction(request):
     """Called when user clicks Cancel on success page"""
-    sold_ids = request.session.get('last_sold_tickets', [])
-    if sold_ids:
+    reservation = get_session_reservation(request, 'last_sold_reservation')
+    if reservation is not None:
         # Revert SOLD tickets to AVAILABLE
-        Ticket.objects.filter(number__in=sold_ids, status='SOLD').update(status='AVAILABLE', buyer_name=None, buyer_phone=None)
-        if 'last_sold_tickets' in request.session:
-            del request.session['last_sold_tickets']
+        with transaction.atomic():
+            transition_tickets(
+                reservation.tickets.filter(status='SOLD'), 'AVAILABLE', 'cancel_transaction',
+                buyer_name=None, buyer_phone=None, locked_at=None, reservation=None
+            )
+            reservation.delete()
+        del request.session['last_sold_reservation']
+        # A retried checkout must not replay the sale that was just cancelled
+        replay_key = request.session.pop('last_checkout_replay', None)
+        if replay_key:
+            cache.delete(replay_key)
         messages.info(request, 'Đã hủy giao dịch.')
+        return redirect_to_event(reservation.event)
     return redirect('index')
 
-def generate_ticket_image(ticket_number):
-    """
-    Generate a ticket image with the ticket number overlaid on the bottom-right corner.
-    Returns a PIL Image object.
-    """
-    # Path to the base ticket template
-    template_path = os.path.join(
-        settings.BASE_DIR,
-        'fundraising',
-        'static',
-        'fundraising',
-        'images',
-        'veso.jpg'
-    )
-
-    font_path = os.path.join(
-        settings.BASE_DIR,
-        'fundraising',
-        'static',
-        'fundraising',
-        'fonts',
-        'Roboto-Regular.ttf'
-    )
-
-    # Open the base image
-    img = Image.open(template_path).convert("RGB")
-    draw = ImageDraw.Draw(img)
-
-    # ✅ Format ticket number (001, 002, ..., 100)
-    formatted_number = f"{int(ticket_number):03d}"
-    text = f"{formatted_number}"
-
-    font = ImageFont.truetype(font_path, 48)
-
-    # Calculate text size
-    bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-
-    # Position: bottom-right corner
-    padding = 15
-    img_width, img_height = img.size
-    x = img_width - text_width - padding - 118
-    y = img_height - text_height - padding - 45
-
-    # ✅ Draw text (black, no background)
-    draw.text(
-        (x, y),
-        text,
-        font=font,
-        fill=(0, 0, 0)  # black text
-    )
-
-    return img
-
 def download_ticket(request, ticket_id):
     """
     Download a single ticket image with the ticket number overlaid.
@@ -252,88 +372,284 @@ def download_ticket(request, ticket_id):
         messages.error(request, 'Vé này chưa được mua.')
         return redirect('index')
     
-    # Generate the ticket image
-    img = generate_ticket_image(ticket.number)
-    
-    # Save to bytes buffer
-    buffer = io.BytesIO()
-    img.save(buffer, format='JPEG', quality=95)
-    buffer.seek(0)
-    
-    # Create HTTP response
-    response = HttpResponse(buffer, content_type='image/jpeg')
+    response = ticket_image_response(request, ticket.number, TICKET_DOWNLOAD_CACHE_CONTROL)
     response['Content-Disposition'] = f'attachment; filename="ve_so_{ticket.number}.jpg"'
     
     return response
 
-def serve_ticket_image(request, ticket_id):
+async def serve_ticket_image(request, ticket_id):
     """
-    Serve the ticket image inline (for <img> tags).
+    Serve the ticket image inline (for <img> tags). ?variant= picks one of
+    IMAGE_VARIANTS; the format follows the Accept header.
     """
-    ticket = get_object_or_404(Ticket, id=ticket_id)
-    img = generate_ticket_image(ticket.number)
-    
-    buffer = io.BytesIO()
-    img.save(buffer, format='JPEG', quality=95)
-    buffer.seek(0)
-    
-    return HttpResponse(buffer, content_type='image/jpeg')
+    variant = request.GET.get('variant', 'full')
+    if variant not in IMAGE_VARIANTS:
+        raise Http404('Unknown image variant')
+    ticket = await aget_object_or_404(Ticket.objects.only('number'), id=ticket_id)
+
+    image_format = negotiate_format(request.headers.get('Accept', ''))
+    response = await aticket_image_response(
+        request, ticket.number, TICKET_IMAGE_CACHE_CONTROL, variant, image_format
+    )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+def _set_image_validators(response, etag, last_modified, cache_control):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
+
+def ticket_image_response(request, number, cache_control, variant='full', image_format='jpeg'):
+    """
+    Image response for a ticket with validators, or 304 when the client's copy
+    is current. Images are rendered once, then served from the image cache.
+    """
+    etag, last_modified = ticket_image_validators(number, variant, image_format)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(
+            get_ticket_image_bytes(number, variant, image_format),
+            content_type=IMAGE_FORMATS[image_format].content_type,
+        )
+    return _set_image_validators(response, etag, last_modified, cache_control)
+
+async def aticket_image_response(request, number, cache_control, variant='full', image_format='jpeg'):
+    """ticket_image_response for async views; cache misses render on the render pool."""
+    if ticket_assets_current():
+        etag, last_modified = ticket_image_validators(number, variant, image_format)
+    else:
+        # Checking or reloading the template and font hits the disk: keep it off the event loop
+        etag, last_modified = await run_in_render_pool(ticket_image_validators, number, variant, image_format)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(
+            await run_in_render_pool(get_ticket_image_bytes, number, variant, image_format),
+            content_type=IMAGE_FORMATS[image_format].content_type,
+        )
+    return _set_image_validators(response, etag, last_modified, cache_control)
+
+
+class _ZipStream:
+    """
+    Write-only file object for ZipFile that hands out what was written so far.
+    It has no tell()/seek(), so ZipFile writes data descriptors and never rewinds.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _render_tickets(numbers):
+    """
+    Yield (number, jpeg bytes) in order, rendering a bounded window ahead
+    in the pool so memory does not grow with the number of tickets.
+    """
+    window = settings.TICKET_RENDER_WORKERS * 2
+    pending = deque()
+    for number in numbers:
+        pending.append((number, render_pool.submit(get_ticket_image_bytes, number)))
+        if len(pending) >= window:
+            number, future = pending.popleft()
+            yield number, future.result()
+    while pending:
+        number, future = pending.popleft()
+        yield number, future.result()
+
+
+async def _arender_tickets(numbers):
+    """_render_tickets for async streams: awaits the pool instead of blocking on it."""
+    loop = asyncio.get_running_loop()
+    window = settings.TICKET_RENDER_WORKERS * 2
+    pending = deque()
+    for number in numbers:
+        pending.append((number, loop.run_in_executor(render_pool, get_ticket_image_bytes, number)))
+        if len(pending) >= window:
+            number, future = pending.popleft()
+            yield number, await future
+    while pending:
+        number, future = pending.popleft()
+        yield number, await future
 
 
-def download_all_tickets(request):
+def _stream_ticket_zip(numbers):
+    stream = _ZipStream()
+    # JPEGs are already compressed, so entries are stored as-is
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as zip_file:
+        for number, image_data in _render_tickets(numbers):
+            zip_file.writestr(f've_so_{number}.jpg', image_data)
+            yield stream.drain()
+    yield stream.drain()
+
+
+async def _astream_ticket_zip(numbers):
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as zip_file:
+        async for number, image_data in _arender_tickets(numbers):
+            zip_file.writestr(f've_so_{number}.jpg', image_data)
+            yield stream.drain()
+    yield stream.drain()
+
+
+async def download_all_tickets(request):
     """
-    Download all purchased tickets as a ZIP file.
+    Download all purchased tickets as a ZIP file, streamed entry by entry.
     """
-    # Get tickets from session
-    sold_ids = request.session.get('last_sold_tickets', [])
+    # Get tickets from the reservation in session
+    reservation = await aget_session_reservation(request, 'last_sold_reservation')
     
-    if not sold_ids:
+    if reservation is None:
         messages.error(request, 'Không tìm thấy vé để tải.')
         return redirect('index')
     
-    # Get tickets from database
-    tickets = Ticket.objects.filter(number__in=sold_ids, status='SOLD')
+    # Get tickets from database before streaming starts
+    numbers = [
+        number async for number in reservation.tickets.filter(status='SOLD')
+        .order_by('number')
+        .values_list('number', flat=True)
+    ]
     
-    if not tickets.exists():
+    if not numbers:
         messages.error(request, 'Không tìm thấy vé để tải.')
         return redirect('index')
     
-    # Create ZIP file in memory
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for ticket in tickets:
-            # Generate ticket image
-            img = generate_ticket_image(ticket.number)
-            
-            # Save image to bytes buffer
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format='JPEG', quality=95)
-            img_buffer.seek(0)
-            
-            # Add to ZIP
-            zip_file.writestr(f've_so_{ticket.number}.jpg', img_buffer.getvalue())
-    
-    zip_buffer.seek(0)
-    
-    # Create HTTP response
-    response = HttpResponse(zip_buffer, content_type='application/zip')
+    # Django can only stream an async iterator under ASGI; WSGI would buffer the whole ZIP
+    if isinstance(request, ASGIRequest):
+        zip_stream = _astream_ticket_zip(numbers)
+    else:
+        zip_stream = _stream_ticket_zip(numbers)
+    response = StreamingHttpResponse(zip_stream, content_type='application/zip')
     response['Content-Disposition'] = 'attachment; filename="ve_so_tat_ca.zip"'
     
     return response
 
+async def ticket_events(request, event_slug=None):
+    """
+    Server-Sent Events stream of ticket status changes for an event's grid.
+    Needs the ASGI entry point (mysite/asgi.py); a sync worker would be held forever.
+    """
+    if not isinstance(request, ASGIRequest):
+        # 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    event = await sync_to_async(get_event)(event_slug)
+
+    async def stream():
+        queue = ticket_broadcaster.subscribe()
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                # Resyncs for lagging subscribers carry no event and go to everyone
+                if message.get('event', event.id) != event.id:
+                    continue
+                yield f'data: {json.dumps(message, separators=(",", ":"))}\n\n'
+        finally:
+            ticket_broadcaster.unsubscribe(queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def ticket_status(request, event_slug=None):
+    """
+    Every ticket's status in an event as one string ('A', 'L', 'S', or '-'
+    for no ticket), whose letter i is ticket number `first` + i. With ?since=<version> only the changes
+    after that version are sent, if they are still known.
+    """
+    event = get_event(event_slug)
+    snapshot = get_snapshot(event)
+    etag = f'"tickets-{event.id}-{snapshot.version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        data = None
+        since = request.GET.get('since')
+        if since is not None:
+            try:
+                changes = changes_since(event.id, int(since), snapshot.version)
+            except ValueError:
+                changes = None
+            if changes is not None:
+                data = {'version': snapshot.version, 'since': int(since), 'changes': changes}
+        if data is None:
+            data = {'version': snapshot.version, 'first': snapshot.first, 'statuses': snapshot.status_string()}
+        response = JsonResponse(data)
+
+    response['ETag'] = etag
+    # Cacheable, but always revalidated since statuses change at any time
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def ticket_stats(request, event_slug=None):
+    """Sales totals for an event, read from its status counters."""
+    event = get_event(event_slug)
+    response = JsonResponse(event_stats(event))
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, aggregated over all workers."""
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def message_feed(request):
+    """
+    Public messages, newest first. Pass the `next` cursor of a page as
+    ?cursor= to get the one after it; `next` is null on the last page.
+    """
+    try:
+        limit = int(request.GET.get('limit', FEED_PAGE_SIZE))
+        page = get_feed_page(request.GET.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor or limit'}, status=400)
+    response = JsonResponse(page)
+    if request.GET.get('cursor'):
+        # Older pages only change when a message is hidden or deleted
+        response['Cache-Control'] = 'public, max-age=60'
+    return response
+
 def submit_message(request):
     if request.method == 'POST':
         name = request.POST.get('name', 'Anonymous')
         phone = request.POST.get('phone', '')
         message = request.POST.get('message')
-        
+
+        # Checked here, as a row the database rejects would fail the buffered batch too
+        if len(name) > UserMessage._meta.get_field('name').max_length or \
+                len(phone) > UserMessage._meta.get_field('phone').max_length:
+            return JsonResponse({'status': 'error', 'message': 'Name or phone is too long'}, status=400)
+
+        if message and settings.MESSAGE_BUFFER:
+            if not message_buffer.put(name, phone, message):
+                response = JsonResponse(
+                    {'status': 'error', 'message': 'Too many messages right now, please try again'}, status=429
+                )
+                response['Retry-After'] = '1'
+                return response
+            return JsonResponse({'status': 'success'})
         if message:
-            UserMessage.objects.create(
+            user_message = UserMessage.objects.create(
                 name=name,
                 phone=phone,
                 message=message
             )
+            add_to_pool(user_message.id)
+            forget_first_page()
             return JsonResponse({'status': 'success'})
         return JsonResponse({'status': 'error', 'message': 'Message is empty'}, status=400)
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=405)
@@ -3,6 +3,12 @@ ASGI config for mysite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it (e.g. ``uvicorn mysite.asgi:application``) to enable the live
+ticket status stream at /events/tickets/, which needs long-lived connections.
+Checkout, ticket images and the ZIP download are async views, so under ASGI
+they wait on the database, the payment API and the render pool without
+holding a thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +18,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+# Persistent connections are not supported under ASGI: each request's
+# connection stays with its thread and is never reused or closed, until the
+# database runs out of connections. Use the psycopg pool (DB_POOL=True) instead.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
+
+# Decode the ticket template and font at startup rather than on the event
+# loop during the first image request
+from fundraising.images import preload_assets  # noqa: E402
+
+preload_assets()
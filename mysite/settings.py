@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from .database import database_from_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +30,52 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-default-dev-key')
 # VietQR Config
 VIETQR_CLIENT_ID = os.getenv('VIETQR_CLIENT_ID')
 VIETQR_API_KEY = os.getenv('VIETQR_API_KEY')
+VIETQR_BANK_BIN = os.getenv('VIETQR_BANK_BIN', '970407')
+VIETQR_ACCOUNT_NO = os.getenv('VIETQR_ACCOUNT_NO', '6816617815')
+VIETQR_ACCOUNT_NAME = os.getenv('VIETQR_ACCOUNT_NAME', 'HUYNH BAO TRONG')
+# Payment QR codes are generated locally; the VietQR API is only used when the
+# qrcode package is missing, through a pooled session with these timeouts
+VIETQR_REMOTE_FALLBACK = os.getenv('VIETQR_REMOTE_FALLBACK', 'True') == 'True'
+VIETQR_CONNECT_TIMEOUT = float(os.getenv('VIETQR_CONNECT_TIMEOUT', '2'))
+VIETQR_READ_TIMEOUT = float(os.getenv('VIETQR_READ_TIMEOUT', '5'))
+VIETQR_POOL_SIZE = int(os.getenv('VIETQR_POOL_SIZE', '10'))
+
+# Ticket image cache: number of encoded images kept in memory per process,
+# plus a directory shared by all workers (empty value disables the disk tier)
+TICKET_IMAGE_CACHE_SIZE = int(os.getenv('TICKET_IMAGE_CACHE_SIZE', '128'))
+TICKET_IMAGE_CACHE_DIR = os.getenv('TICKET_IMAGE_CACHE_DIR', str(BASE_DIR / 'ticket_cache'))
+
+# Threads that render ticket images and payment QR codes (the ZIP download,
+# image misses and the async views all share them)
+TICKET_RENDER_WORKERS = int(os.getenv('TICKET_RENDER_WORKERS', '4'))
+
+# Event served at / and the unprefixed URLs; others live under /event/<slug>/
+DEFAULT_EVENT_SLUG = os.getenv('DEFAULT_EVENT', 'default')
+
+# Ticket locks expire after their event's lock_seconds (TICKET_LOCK_SECONDS for
+# new events). Reads treat expired locks as available right away; the reaper
+# writes them back every TICKET_REAPER_INTERVAL seconds, either via
+# `manage.py reap_expired_locks` or a thread started by the first request
+# each server process handles.
+TICKET_LOCK_SECONDS = int(os.getenv('TICKET_LOCK_SECONDS', '180'))
+TICKET_REAPER_INTERVAL = int(os.getenv('TICKET_REAPER_INTERVAL', '30'))
+TICKET_REAPER_THREAD = os.getenv('TICKET_REAPER_THREAD', 'False') == 'True'
+
+# Buffered message inserts: submit_message queues up to MESSAGE_BUFFER_SIZE
+# messages per process and a thread writes them in batches of MESSAGE_BATCH_SIZE
+# at least every MESSAGE_FLUSH_INTERVAL seconds. Queued messages are lost if the
+# worker is killed before they are flushed.
+MESSAGE_BUFFER = os.getenv('MESSAGE_BUFFER', 'False') == 'True'
+MESSAGE_BUFFER_SIZE = int(os.getenv('MESSAGE_BUFFER_SIZE', '1000'))
+MESSAGE_BATCH_SIZE = int(os.getenv('MESSAGE_BATCH_SIZE', '100'))
+MESSAGE_FLUSH_INTERVAL = float(os.getenv('MESSAGE_FLUSH_INTERVAL', '0.5'))
+
+# Metrics served at /metrics. Set METRICS_DIR to a directory shared by the
+# gunicorn workers (cleared on deploy) to aggregate them; empty keeps per-process values.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))
+# Requests slower than this are logged with their SQL
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '1'))
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', 'True') == 'True'
@@ -51,8 +98,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fundraising.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', # Add Whitenoise
+    'fundraising.middleware.StaticFilesMiddleware', # WhiteNoise, async-capable
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,10 +132,45 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Configured from DATABASE_URL (see mysite/database.py). SQLite gets WAL,
+# synchronous=NORMAL, a busy timeout and IMMEDIATE transactions; PostgreSQL can
+# use a psycopg connection pool with DB_POOL=True. DB_CONN_MAX_AGE keeps
+# connections open between requests under WSGI; mysite/asgi.py defaults it to
+# 0, as ASGI servers would leak them, so use the pool there.
+
 DATABASES = {
+    'default': database_from_url(
+        os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3'),
+        BASE_DIR,
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        pool={
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        } if os.getenv('DB_POOL', 'False') == 'True' else None,
+        sqlite={
+            'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+            'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+            'busy_timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+            'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+        },
+    )
+}
+
+
+# Cache
+# The ticket availability snapshots and deltas, the grid fragments, checkout
+# idempotency keys and QR codes live here, so every worker process must see
+# the same cache (availability versions are kept on the event row). The
+# default file-based cache is shared by the processes on one host; with
+# several hosts use Redis. LocMemCache is per process and only allowed with DEBUG.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'django_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000')),
+        },
     }
 }
 
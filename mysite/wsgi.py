@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_wsgi_application()
+
+# Decode the ticket template and font before workers fork when gunicorn
+# runs with --preload, so every worker shares the same pages
+from fundraising.images import preload_assets  # noqa: E402
+
+preload_assets()